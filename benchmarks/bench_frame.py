@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Terminal output while scrolling the media list: the interface runs in
+a pseudo terminal and scrolls one line at a time, bytes written to the
+terminal and flushes (curses.doupdate) are reported per scroll step
+
+Run from the repository root: python benchmarks/bench_frame.py """
+import os
+import pty
+import sys
+import time
+import shutil
+import select
+import tempfile
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+steps = 200
+nmedia = 2000
+marker = b'\x1b]termipod-bench\x07'
+
+
+def make_db(filename):
+    from termipod.database import DataBase
+    db = DataBase(filename, print)
+    items = [{'link': f'http://example.com/{i}.mp3',
+              'title': f'Episode {i} of the benchmark channel',
+              'date': 1e9+3600*i, 'description': '', 'duration': i % 3600}
+             for i in range(nmedia)]
+    db.add_channel({'url': 'http://example.com/feed', 'title': 'Channel',
+                    'type': 'rss', 'categories': [], 'auto': '',
+                    'updated': 0, 'addcount': -1, 'disabled': False,
+                    'mask': '', 'thumbnail': '', 'items': items})
+    db.conn.close()
+
+
+def scroll(tmpdir):
+    """ Run in the pseudo terminal """
+    import curses
+    import termipod.config as Config
+    Config.init(config_path=os.path.join(tmpdir, 'termipod.yaml'),
+                **{'Global.db_path': os.path.join(tmpdir, 'termipod.db'),
+                   'Global.media_path': os.path.join(tmpdir, 'media')})
+    make_db(Config.get('Global.db_path'))
+
+    import termipod.ui as ui
+    from termipod.itemlist import ItemLists
+
+    updates = [0]
+    doupdate = curses.doupdate
+
+    def counted_doupdate():
+        updates[0] += 1
+        doupdate()
+    curses.doupdate = counted_doupdate
+
+    ui.init()
+    ui.item_lists = ItemLists(print_infos=ui.print_infos, wait=True)
+    ui.tabs.add_tab(ui.MediumArea(ui.screen, 'Media'))
+    ui.tabs.show_tab(0)
+    ui.frame.flush()
+    time.sleep(0.5)
+
+    # Each step has time for its own frame
+    interval = 1.5/max(1, Config.get('Global.max_fps'))
+    updates[0] = 0
+    os.write(sys.stdout.fileno(), marker)
+    for _ in range(steps):
+        ui.tabs.move_screen('line', 'down')
+        time.sleep(interval)
+    time.sleep(0.5)
+    os.write(sys.stdout.fileno(), marker)
+    curses.endwin()
+
+    with open(os.path.join(tmpdir, 'updates'), 'w') as f:
+        f.write(str(updates[0]))
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.environ['TERM'] = 'xterm-256color'
+        try:
+            scroll(tmpdir)
+        except BaseException:
+            traceback.print_exc()
+        os._exit(0)
+
+    output = b''
+    while True:
+        ready, _, _ = select.select([fd], [], [], 30)
+        if not ready:
+            break
+        try:
+            data = os.read(fd, 1 << 16)
+        except OSError:
+            break
+        if not data:
+            break
+        output += data
+    os.waitpid(pid, 0)
+
+    try:
+        parts = output.split(marker)
+        if len(parts) < 3:
+            print('Interface did not start:')
+            print(output.decode(errors='replace')[-2000:])
+            return
+        with open(os.path.join(tmpdir, 'updates')) as f:
+            updates = int(f.read())
+        print(f'{steps} scroll steps: {len(parts[1])/steps:.0f} bytes and '
+              f'{updates/steps:.2f} flushes per step')
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" printable_str on 10k multilingual titles, compared with the previous
+per character implementation (results are checked to be the same)
+
+Run from the repository root: python benchmarks/bench_printable_str.py """
+import os
+import re
+import sys
+import time
+import random
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from termipod.utils import printable_str  # noqa: E402
+
+
+def previous_printable_str(string):
+    new_str = ''
+    for c in string:
+        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+        c = ansi_escape.sub('', c)
+        if unicodedata.category(c)[0] in ('M', 'C'):
+            continue
+        w = unicodedata.east_asian_width(c)
+        if w in ('N', 'Na', 'H', 'A'):
+            new_str += c
+        else:
+            new_str += '🖥'
+    return new_str
+
+
+def main():
+    random.seed(0)
+    samples = [
+        'Episode 12: The quick brown fox',
+        'Épisode spécial – café crème',
+        '東京の夜 第3話',
+        'Привет мир выпуск',
+        'नमस्ते दुनिया',
+        'مرحبا بالعالم',
+        'emoji 😀 party​\tx',
+        'é combining',
+    ]
+    titles = [f'{random.choice(samples)} {i}' for i in range(10000)]
+
+    for title in titles:
+        assert printable_str(title) == previous_printable_str(title), title
+
+    start = time.time()
+    for title in titles:
+        previous_printable_str(title)
+    previous = time.time()-start
+
+    start = time.time()
+    for title in titles:
+        printable_str(title)
+    current = time.time()-start
+
+    print(f'{len(titles)} titles: {previous:.2f}s before, '
+          f'{current:.2f}s now')
+
+
+if __name__ == '__main__':
+    main()
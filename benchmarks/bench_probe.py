@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Duration probing from headers of synthetic MP3 (CBR, Xing, VBR without
+header), M4A, Opus, Vorbis and WebM files, with ffprobe if available.
+CBR MP3 duration is estimated from the file size, so it can be off by a
+fraction of a second
+
+Run from the repository root: python benchmarks/bench_probe.py """
+import os
+import sys
+import time
+import shutil
+import struct
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import termipod.probe as probe  # noqa: E402
+
+repeat = 20
+nframes = 10000
+
+
+def mp3_frame(bitrate_index):
+    """ MPEG1 layer 3 frame at 44100Hz """
+    length = 144*probe.mp3_bitrates[(True, 3)][bitrate_index]*1000//44100
+    return bytes([0xff, 0xfb, bitrate_index << 4, 0x00])+bytes(length-4)
+
+
+def box(box_type, payload):
+    return struct.pack('>I4s', 8+len(payload), box_type)+payload
+
+
+def ogg_page(granule, payload, header_type=0):
+    return (b'OggS\x00'+bytes([header_type])
+            + struct.pack('<qIIIB', granule, 1, 0, 0, 1)
+            + bytes([len(payload)])+payload)
+
+
+def ebml(element_id, payload):
+    """ Element with a one byte size (payload shorter than 127 bytes) """
+    return (element_id.to_bytes((element_id.bit_length()+7)//8, 'big')
+            + bytes([0x80 | len(payload)])+payload)
+
+
+def write_samples(directory):
+    """ Samples by filename, with their expected durations """
+    samples = {}
+    mp3_duration = nframes*1152/44100
+
+    id3 = b'ID3\x03\x00\x00'+bytes([0, 0, 0, 20])+bytes(20)
+    samples['cbr.mp3'] = (id3+mp3_frame(9)*nframes+b'TAG'+bytes(125),
+                          mp3_duration)
+
+    vbr_frames = b''.join(mp3_frame(5+i % 5) for i in range(nframes))
+    xing = bytearray(mp3_frame(9))
+    xing[36:48] = b'Xing'+struct.pack('>II', 1, nframes)
+    samples['xing.mp3'] = (bytes(xing)+vbr_frames, mp3_duration)
+    samples['vbr.mp3'] = (vbr_frames, mp3_duration)
+
+    mvhd = box(b'mvhd', bytes(4)+struct.pack('>IIII', 0, 0, 1000, 3723456)
+               + bytes(80))
+    samples['a.m4a'] = (box(b'ftyp', b'M4A \x00\x00\x00\x00')
+                        + box(b'mdat', bytes(1 << 20))+box(b'moov', mvhd),
+                        3723.456)
+
+    opus_head = b'OpusHead\x01\x02'+struct.pack('<HIhB', 312, 48000, 0, 0)
+    samples['a.opus'] = (ogg_page(0, opus_head, 2)+bytes(1 << 20)
+                         + ogg_page(48000*95+312, bytes(10), 4), 95)
+
+    vorbis_head = (b'\x01vorbis'
+                   + struct.pack('<IBIiii', 0, 2, 44100, 0, 0, 0)+b'\x01')
+    samples['a.ogg'] = (ogg_page(0, vorbis_head, 2)+bytes(300000)
+                        + ogg_page(44100*42, bytes(10), 4), 42)
+
+    info = ebml(0x1549a966,
+                ebml(0x2ad7b1, (1000000).to_bytes(3, 'big'))
+                + ebml(0x4489, struct.pack('>d', 61500.0)))
+    segment = (bytes.fromhex('18538067')+b'\x01'+b'\xff'*7
+               + ebml(0x114d9b74, bytes(10))+info
+               + bytes.fromhex('1f43b675')+b'\xff')
+    samples['a.webm'] = (ebml(0x1a45dfa3, ebml(0x4282, b'webm'))+segment
+                         + bytes(1 << 20), 61.5)
+
+    for name, (content, _) in samples.items():
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(content)
+    return {name: duration for name, (_, duration) in samples.items()}
+
+
+def run(get_duration, filenames):
+    start = time.time()
+    for _ in range(repeat):
+        durations = [get_duration(filename) for filename in filenames]
+    return durations, (time.time()-start)/repeat/len(filenames)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        expected = write_samples(directory)
+        names = sorted(expected)
+        filenames = [os.path.join(directory, name) for name in names]
+
+        durations, per_file = run(probe.get_duration, filenames)
+        for name, duration in zip(names, durations):
+            print(f'{name:>9}: {duration} ({int(expected[name])} expected)')
+        print(f'headers: {per_file*1000:.2f}ms per file')
+
+        if shutil.which('ffprobe'):
+            _, per_file = run(probe.get_duration_ffprobe, filenames)
+            print(f'ffprobe: {per_file*1000:.2f}ms per file')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
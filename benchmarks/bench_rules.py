@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Automatic download rules: 5000 channels evaluated on 1000 new media
+
+Run from the repository root: python benchmarks/bench_rules.py """
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import termipod.config as Config  # noqa: E402
+from termipod.rules import AutoRules  # noqa: E402
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    Config.init(config_path=os.path.join(tmpdir, 'termipod.yaml'))
+    Config.set('Global.auto_min_minutes', 2)
+    Config.set('Global.auto_max_minutes', 60)
+    Config.set('Global.auto_skip_categories', 'news')
+    Config.set('Global.auto_skip_pattern', 'live')
+
+    media = [{'title': f'ep {i} live' if i % 7 == 0 else f'ep {i}',
+              'duration': i*10} for i in range(1000)]
+    # 50 distinct patterns, as channels often share them
+    channels = [{'auto': f'ep [0-9]*{i % 50}$',
+                 'categories': ['news'] if i % 10 == 0 else []}
+                for i in range(5000)]
+
+    start = time.time()
+    rules = AutoRules()
+    selected = sum(len(rules.select(channel, media))
+                   for channel in channels)
+    print(f'{len(channels)} channels x {len(media)} media: '
+          f'{selected} selected in {time.time()-start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
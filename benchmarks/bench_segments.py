@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Download of a 12MiB file from a local server throttled to about
+20MB/s per connection, with one stream then with four segments
+
+Run from the repository root: python benchmarks/bench_segments.py """
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import termipod.config as Config  # noqa: E402
+import termipod.bandwidth as bandwidth  # noqa: E402
+import termipod.httpdownload as httpdownload  # noqa: E402
+
+data = os.urandom(12*1024**2)
+etag = '"bench"'
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        start, end = 0, len(data)-1
+        byte_range = self.headers.get('Range')
+        if byte_range and self.headers.get('If-Range') == etag:
+            first, last = byte_range[len('bytes='):].split('-')
+            start = int(first)
+            end = int(last) if last else end
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end-start+1))
+        self.end_headers()
+        try:
+            for position in range(start, end+1, 1 << 16):
+                self.wfile.write(
+                    data[position:min(position+(1 << 16), end+1)])
+                time.sleep(0.003)
+        except (BrokenPipeError, ConnectionResetError):
+            # First segment is read from the whole file response
+            pass
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    Config.init(config_path=os.path.join(tmpdir, 'termipod.yaml'))
+    # One slot is kept for feeds
+    Config.set('Global.host_connections', 5)
+    Config.set('Global.bandwidth_limit', 0)
+    bandwidth.update_config()
+
+    server = ThreadingServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_port}/medium.mp3'
+    filename = os.path.join(tmpdir, 'medium.mp3')
+
+    try:
+        for segments in (1, 4):
+            Config.set('Global.download_segments', segments)
+            start = time.time()
+            httpdownload.download(url, filename)
+            duration = time.time()-start
+            with open(filename, 'rb') as f:
+                same = (hashlib.sha1(f.read()).digest()
+                        == hashlib.sha1(data).digest())
+            os.unlink(filename)
+            print(f'{segments} segment(s): {duration:.2f}s, '
+                  f'{"identical" if same else "DIFFERENT"} output')
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Area selection updates: 500 media hidden then shown again, as when
+they are marked as read then unread in a view filtered on unread media.
+Compares the previous deque (linear search) with IndexedList
+
+Run from the repository root: python benchmarks/bench_selection.py """
+import os
+import sys
+import time
+import random
+from bisect import bisect
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from termipod.indexedlist import IndexedList  # noqa: E402
+
+
+def update_deque(selection, hidden, shown):
+    for index in hidden:
+        try:
+            position = selection.index(index)
+        except ValueError:
+            pass
+        else:
+            del selection[position]
+    for index in shown:
+        try:
+            selection.index(index)
+        except ValueError:
+            selection.insert(bisect(selection, index), index)
+
+
+def update_indexed(selection, hidden, shown):
+    for index in hidden:
+        if index in selection:
+            selection.remove(index)
+    for index in shown:
+        if index in selection:
+            selection.remove(index)
+        selection.insert_sorted(index, int)
+
+
+def main():
+    random.seed(0)
+    for size in (60000, 200000):
+        changed = random.sample(range(size), 500)
+        for name, cls, update in (('deque', deque, update_deque),
+                                  ('IndexedList', IndexedList,
+                                   update_indexed)):
+            selection = cls(range(size))
+            start = time.time()
+            update(selection, changed, [])
+            hidden = time.time()-start
+            start = time.time()
+            update(selection, [], changed)
+            shown = time.time()-start
+            assert list(selection) == list(range(size))
+            print(f'{name:>12} {size:>7} items: hide 500 {hidden:.3f}s, '
+                  f'show again {shown:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
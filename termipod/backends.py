@@ -16,21 +16,31 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import os
-import shlex
-from time import sleep, mktime
+import hashlib
+import traceback
+from time import mktime, time
 from datetime import datetime
-from queue import Queue
-from threading import Thread
+from queue import PriorityQueue
+from itertools import count
+from heapq import heappush, heappop
+from random import uniform
+from urllib.parse import urlsplit
+from threading import Thread, Lock, Condition
+from collections import Counter, defaultdict, deque
 import multiprocessing
-import subprocess
-import re
+from multiprocessing.connection import wait as wait_ready
 
 import os.path
 
 import termipod.rss as rss
 import termipod.yt as yt
-from termipod.utils import str_to_filename, ts_to_date, noop, run_all
-from termipod.backends_exceptions import DownloadError
+import termipod.probe as probe
+import termipod.httpdownload as httpdownload
+from termipod.utils import (str_to_filename, ts_to_date, noop, run_all,
+                            format_size, print_log)
+from termipod.rules import filter_by_pattern
+from termipod.backends_exceptions import DownloadError, HostError
+import termipod.config as Config
 
 
 def media_add_missing_fields(data, browse=False):
@@ -39,6 +49,10 @@ def media_add_missing_fields(data, browse=False):
         ('duration', 0),
         ('description', ''),
         ('thumbnail', ''),
+        ('size', 0),
+        ('mtime', 0),
+        ('played', 0),
+        ('downloaded', 0),
     )
 
     for f, v in fields:
@@ -72,7 +86,7 @@ def get_all_data(url, opts, print_infos, browse=False):
         data = rss.get_all_data(url, opts, print_infos)
 
     if 'mask' in opts and opts['mask']:
-        apply_mask(data, re.compile(opts['mask']))
+        apply_mask(data, opts['mask'])
 
     channel_add_missing_fields(data, browse)
     return data
@@ -107,9 +121,7 @@ def get_video_data_only(url, opts, print_infos):
 
 
 def apply_mask(data, mask):
-    regex = re.compile(mask)
-    data['items'] = [medium for medium in data['items']
-                     if regex.match(medium['title'])]
+    data['items'] = filter_by_pattern(data['items'], mask)
     return data
 
 
@@ -157,16 +169,7 @@ def shrink_link(channel, link):
 
 
 def get_duration(medium):
-    filename = os.path.abspath(medium['filename']).replace('"', '\\"')
-    commandline = ('ffprobe -i "%s" -show_entries '
-                   'format=duration -v quiet -of csv="p=0"' % filename)
-    args = shlex.split(commandline)
-    result = subprocess.Popen(
-            args,
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    output = result.communicate()
-    duration = int(float(output[0]))
-    return duration
+    return probe.get_duration(medium['filename'])
 
 
 def get_download_func(medium):
@@ -178,6 +181,10 @@ def get_medium_backend(medium):
     return yt if medium['channel']['type'] == 'youtube' else rss
 
 
+def get_medium_backend_name(medium):
+    return 'youtube' if medium['channel']['type'] == 'youtube' else 'rss'
+
+
 def get_filename(medium, backend, print_infos):
     ext = backend.get_filename_extension(medium)
     filename = str_to_filename(
@@ -189,16 +196,82 @@ def get_filename(medium, backend, print_infos):
     return filename
 
 
+def get_file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_file(source, target):
+    """ Replace target by a hard link to source (raises OSError) """
+    temp = target+'.link'
+    os.link(source, temp)
+    os.replace(temp, target)
+
+
+class DownloadProgress():
+    """ Channel from a download process to the download manager: progress
+    (at most every interval) and messages """
+    interval = 0.2
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.last = 0
+
+    def update(self, done, total):
+        now = time()
+        if now-self.last >= self.interval or done == total:
+            self.last = now
+            self.send(('progress', done, total))
+
+    def print_infos(self, *args, **kwargs):
+        self.send(('print', args, kwargs))
+
+    def send(self, message):
+        try:
+            self.conn.send(message)
+        except OSError:
+            pass
+
+
 class DownloadManager():
     def __init__(self, db, print_infos, wait=False, cb=noop):
-        self.nthreads = 2
+        self.nthreads = Config.get('Global.download_nthreads')
         self.print_infos = print_infos
-        self.queue = Queue()
+        # Entries are (-priority, order, medium, cb)
+        self.queue = PriorityQueue()
+        self.order = count()
+        # Failed attempts by link
+        self.attempts = {}
         self.wait = wait
         self.db = db
         self.cb = cb
-        self.max_retries = 3
+        self.max_retries = Config.get('Global.download_retries')
+        self.retry_delay = Config.get('Global.download_retry_delay')
+        self.max_retry_delay = 3600
+        self.mutex = Lock()
+        # Failed downloads as (time, entry), and given up ones
+        self.retries = []
+        self.retries_cond = Condition(self.mutex)
+        self.dead_letters = []
+        # Consecutive failures by host, and time before trying it again
+        self.host_failures = Counter()
+        self.host_retry_at = {}
+        # Queued downloads to skip, and cancel pipes of running ones
         self.cancel_requests = {}
+        self.cancel_pipes = {}
+        # Downloads running, and waiting for a free slot, by backend
+        self.running = Counter()
+        self.deferred = defaultdict(deque)
+        # Progress of running downloads by link
+        self.progress = {}
+        # Disk space saved by linking identical files
+        self.reclaimed = 0
 
         # Set up some threads to fetch the items to download
         for i in range(self.nthreads):
@@ -206,47 +279,171 @@ class DownloadManager():
             worker.daemon = True
             worker.start()
 
+        scheduler = Thread(target=self.handle_retries)
+        scheduler.daemon = True
+        scheduler.start()
+
     def handle_queue(self):
         """This is the worker thread function. It processes items in the queue one
         after another.  These daemon threads go into an infinite loop, and only
         exit when the main thread ends."""
         q = self.queue
 
-        # Wait for UI to be ready
-        if not self.wait:
-            sleep(2)
-
         while True:
-            medium, cb = q.get()
+            entry = q.get()
+            _, _, medium, cb = entry
+            name = get_medium_backend_name(medium)
+            host = urlsplit(medium['link']).hostname
+            with self.mutex:
+                host_retry = self.host_retry_at.get(host, 0)
+                if host_retry > time():
+                    # Wait with other downloads from a failing host
+                    self.schedule(entry, host_retry)
+                    q.task_done()
+                    continue
+
+                limit = Config.get(f'Global.download_{name}_nthreads')
+                if limit and self.running[name] >= limit:
+                    # Queued again when a download of this backend ends
+                    self.deferred[name].append(entry)
+                    q.task_done()
+                    continue
+                self.running[name] += 1
+
+            failed = True
+            host_failed = False
+            error = 'Download interrupted'
             try:
                 self.download(medium, cb)
-                q.task_done()
-            except DownloadError:
-                if not medium['link'] in self.handle_queue.retries:
-                    self.handle_queue.retries[medium['link']] = 1
+                failed = False
+            except DownloadError as e:
+                error = str(e)
+                host_failed = isinstance(e, HostError)
+            except Exception as e:
+                # Failed attempt, the worker must go on
+                error = f'Unexpected error: {e!r}'
+                print_log(traceback.format_exc())
+            finally:
+                with self.mutex:
+                    self.running[name] -= 1
+                    if self.deferred[name]:
+                        q.put(self.deferred[name].popleft())
+                    # Host answered
+                    if not host_failed:
+                        self.host_failures.pop(host, None)
+                        self.host_retry_at.pop(host, None)
+
+                try:
+                    if failed:
+                        self.retry_later(entry, host, error, host_failed)
+                finally:
+                    q.task_done()
+
+    def handle_retries(self):
+        """ Queue again failed downloads when their delay is over """
+        with self.retries_cond:
+            while True:
+                if not self.retries:
+                    self.retries_cond.wait()
+                    continue
 
-                if (self.max_retries
-                        <= self.handle_queue.retries[medium['link']]):
+                delay = self.retries[0][0]-time()
+                if delay > 0:
+                    self.retries_cond.wait(delay)
                     continue
 
-                self.handle_queue.retries[medium['link']] += 1
-                sleep(5)
-                self.add(medium, update=False)
-    handle_queue.retries = {}
+                _, entry = heappop(self.retries)
+                self.queue.put(entry)
+                # For wait_done
+                self.retries_cond.notify_all()
+
+    def schedule(self, entry, when):
+        """ Queue entry at time when (mutex needs to be held) """
+        heappush(self.retries, (when, entry))
+        self.retries_cond.notify_all()
+
+    def get_retry_delay(self, failures):
+        """ Exponential backoff with jitter """
+        delay = min(self.retry_delay * 2**(failures-1), self.max_retry_delay)
+        return uniform(delay/2, delay)
+
+    def retry_later(self, entry, host, error, host_failed=False):
+        """ Schedule failed download again, not before its host can be
+        tried again, or give up after too many attempts. Only host failures
+        delay other downloads from host """
+        medium = entry[2]
+        link = medium['link']
+        with self.mutex:
+            attempts = self.attempts.get(link, 0)+1
+            self.attempts[link] = attempts
+            now = time()
+            if host_failed:
+                self.host_failures[host] += 1
+                self.host_retry_at[host] = (
+                    now+self.get_retry_delay(self.host_failures[host]))
+            host_retry = self.host_retry_at.get(host, 0)
+
+            retry = attempts < self.max_retries
+            if retry:
+                when = max(now+self.get_retry_delay(attempts), host_retry)
+                self.schedule(entry, when)
+            else:
+                when = 0
+                self.dead_letters.append((medium, error))
+
+        self.db.update_download(medium, attempts, int(when),
+                                self.get_part_size(medium), error)
+        if not retry:
+            self.print_infos(f'Download of {medium["title"]} abandoned: '
+                             f'{error}', mode='error')
+
+    def add_dead_letter(self, medium, error):
+        """ Medium whose download was abandoned in a previous run """
+        with self.mutex:
+            self.dead_letters.append((medium, error))
+
+    def add(self, medium, cb=None, update=True, priority=0, attempts=0,
+            next_attempt=0):
+        """ Queue medium for download (higher priority first), not before
+        next_attempt. If update is False, medium is already marked and
+        queued in database """
+        # Default to media list callbacks (run_all needs a list)
+        if cb is None:
+            cb = self.cb
 
-    def add(self, medium, cb=noop, update=True):
         if update:
             self.print_infos('Add to download: %s' % medium['title'])
             medium['location'] = 'download'
-            self.db.update_media([medium])
+            self.db.add_download(medium, priority)
+
+        entry = (-priority, next(self.order), medium, cb)
+        with self.mutex:
+            self.cancel_requests.pop(medium['link'], None)
+            self.attempts[medium['link']] = attempts
+            if next_attempt > time():
+                self.schedule(entry, next_attempt)
+                return
 
-        if medium['link'] in self.cancel_requests:
-            del self.cancel_requests[medium['link']]
+        self.queue.put(entry)
 
-        self.queue.put((medium, cb))
+    def get_part_size(self, medium):
+        """ Size of partially downloaded file of medium """
+        backend = get_medium_backend(medium)
+        filename = get_filename(medium, backend, self.print_infos)
+        try:
+            return os.path.getsize(f'{filename}.part')
+        except OSError:
+            return 0
 
     def wait_done(self):
-        self.queue.join()
+        while True:
+            self.queue.join()
+            with self.retries_cond:
+                # Failed downloads are pushed before their task is done
+                if not self.retries and not self.queue.unfinished_tasks:
+                    return
+                if self.retries:
+                    self.retries_cond.wait()
 
     def download(self, medium, cb):
         link = medium['link']
@@ -271,53 +468,241 @@ class DownloadManager():
 
         filename = get_filename(medium, backend, self.print_infos)
 
-        ret = multiprocessing.Queue()
-        # Download needs to be done as a new process to be able to cancel it
-        # XXX FIXME problem with print_infos in distributed memory!
+        # Same content already downloaded (e.g. for another channel)
+        if self.link_known_file(link, filename):
+            self.set_downloaded(medium, filename)
+            media = [medium]
+            self.db.update_media(media)
+            self.db.remove_download(medium)
+            run_all(cb, ('modified', media))
+            return
+
+        ret_reader, ret_writer = multiprocessing.Pipe(duplex=False)
+        cancel_reader, cancel_writer = multiprocessing.Pipe(duplex=False)
+        with self.mutex:
+            if link in self.cancel_requests:
+                del self.cancel_requests[link]
+                return
+            self.cancel_pipes[link] = cancel_writer
+
+        # Download needs to be done as a new process to be able to cancel
+        # it, messages and progress come through a pipe
+        progress_reader, progress_writer = multiprocessing.Pipe(
+            duplex=False)
         p = multiprocessing.Process(
             target=self.download_task,
-            args=(ret, (dl_func, link, filename, self.print_infos)))
+            args=(ret_writer, progress_writer, (dl_func, link, filename)))
         p.daemon = True
+        with self.mutex:
+            # Done is None until first message (offset of resumed download)
+            self.progress[link] = {'medium': medium, 'done': None,
+                                   'total': None, 'rate': 0, 'time': time()}
         p.start()
+        ret_writer.close()
+        progress_writer.close()
 
-        # While download is running, check if needs to be cancelled
-        while p.is_alive():
-            sleep(1)
-            if link in self.cancel_requests:
+        # Wait for end of process or cancellation
+        waited = [p.sentinel, cancel_reader, progress_reader]
+        while True:
+            ready = wait_ready(waited)
+            cancelled = cancel_reader in ready
+            if cancelled:
                 p.kill()
-                del self.cancel_requests[link]
+                break
+            if progress_reader in ready:
+                if not self.read_progress(link, progress_reader):
+                    waited.remove(progress_reader)
+            if p.sentinel in ready:
+                break
         p.join()
+        if progress_reader in waited:
+            self.read_progress(link, progress_reader)
+        progress_reader.close()
+
+        with self.mutex:
+            del self.cancel_pipes[link]
+            del self.progress[link]
+        cancel_reader.close()
+        cancel_writer.close()
 
-        if not p.exitcode:
-            if ret.get_nowait():  # Download failed
+        if not cancelled:
+            try:
+                status, result = (ret_reader.recv() if ret_reader.poll()
+                                  else ('error', None))
+            except EOFError:
+                status, result = 'error', None
+            ret_reader.close()
+
+            if p.exitcode or status != 'done':  # Download failed
                 self.print_infos('Download failed %s' % link)
-                raise(DownloadError)
+                error = (HostError if status == 'host_error'
+                         else DownloadError)
+                raise error(result or f'Download process exited '
+                            f'with code {p.exitcode}')
             else:
                 self.print_infos('Downloaded (%s)' % medium['title'])
-                # Change location and filename
-                medium['filename'] = filename
-                medium['location'] = 'local'
-
-                if 0 == medium['duration']:
-                    medium['duration'] = get_duration(medium)
+                self.index_file(link, filename, result)
+                self.set_downloaded(medium, filename)
 
         else:
             self.print_infos('Download cancelled %s' % link)
 
         media = [medium]
         self.db.update_media(media)
+        # Removed once medium is saved as local (a download row left by a
+        # crash is dropped by download_marked)
+        if medium['location'] == 'local':
+            self.db.remove_download(medium)
         run_all(cb, ('modified', media))
 
-    def download_task(self, ret, args):
+    def set_downloaded(self, medium, filename):
+        self.attempts.pop(medium['link'], None)
+        # Change location and filename
+        medium['filename'] = filename
+        medium['location'] = 'local'
+        # File modification time can be set by the server (youtube-dl) or
+        # by another download (same file linked)
+        medium['downloaded'] = int(time())
         try:
-            ret.put(args[0](*args[1:]))
-        except DownloadError:
+            stat = os.stat(filename)
+            medium['size'] = stat.st_size
+            medium['mtime'] = int(stat.st_mtime)
+        except OSError:
+            pass
+
+        if 0 == medium['duration']:
+            medium['duration'] = get_duration(medium)
+
+    def download_task(self, ret, conn, args):
+        """ Sends ('done', validator of file), ('host_error', message) or
+        ('error', message) """
+        progress = DownloadProgress(conn)
+        try:
+            ret.send(('done', args[0](*args[1:], progress.print_infos,
+                                      progress.update)))
+        except HostError as e:
+            ret.send(('host_error', str(e)))
+            exit(-1)
+        except DownloadError as e:
+            ret.send(('error', str(e)))
             exit(-1)
 
+    def add_reclaimed(self, filename, source, size):
+        self.reclaimed += size
+        self.print_infos(f'{filename} linked to same file {source}: '
+                         f'{format_size(size)} reclaimed '
+                         f'({format_size(self.reclaimed)} in total)')
+
+    def link_known_file(self, link, filename):
+        """ Link filename to a file previously downloaded from link, if it
+        did not change (same validator) """
+        stale = []
+        linked = False
+        for known in self.db.find_files('url', link):
+            # Without validator, url can give new content (latest.mp3)
+            if not known['validator']:
+                continue
+            try:
+                if os.stat(known['filename']).st_size != known['size']:
+                    stale.append(known['filename'])
+                    continue
+            except OSError:
+                stale.append(known['filename'])
+                continue
+            if known['validator'] != httpdownload.get_validator(link):
+                continue
+            try:
+                link_file(known['filename'], filename)
+            except OSError:
+                continue
+
+            self.db.add_file(filename, known['hash'], known['size'], link,
+                             known['validator'])
+            self.add_reclaimed(filename, known['filename'], known['size'])
+            linked = True
+            break
+
+        if stale:
+            self.db.remove_files(stale)
+        return linked
+
+    def index_file(self, link, filename, validator):
+        """ Record content hash of downloaded file, and replace it by a
+        hard link if the same content was already downloaded """
+        try:
+            size = os.path.getsize(filename)
+            digest = get_file_hash(filename)
+        except OSError:
+            return
+
+        stale = []
+        for known in self.db.find_files('hash', digest):
+            if known['filename'] == filename:
+                continue
+            try:
+                if os.stat(known['filename']).st_size != size:
+                    stale.append(known['filename'])
+                    continue
+                if os.path.samefile(known['filename'], filename):
+                    break
+                link_file(known['filename'], filename)
+            except FileNotFoundError:
+                stale.append(known['filename'])
+                continue
+            except OSError:  # Other filesystem
+                continue
+
+            self.add_reclaimed(filename, known['filename'], size)
+            break
+
+        if stale:
+            self.db.remove_files(stale)
+        self.db.add_file(filename, digest, size, link, validator)
+
+    def read_progress(self, link, reader):
+        """ Handle messages from download process (False at end) """
+        try:
+            while reader.poll():
+                message = reader.recv()
+                if message[0] == 'print':
+                    self.print_infos(*message[1], **message[2])
+                else:
+                    self.update_progress(link, *message[1:])
+        except (EOFError, OSError):
+            return False
+        return True
+
+    def update_progress(self, link, done, total):
+        now = time()
+        with self.mutex:
+            progress = self.progress[link]
+            elapsed = now-progress['time']
+            # First message only gives the starting point
+            if progress['done'] is not None and elapsed > 0:
+                # Smoothed rate
+                rate = (done-progress['done'])/elapsed
+                progress['rate'] = (0.7*progress['rate']+0.3*rate
+                                    if progress['rate'] else rate)
+            progress.update(done=done, total=total, time=now)
+
+    def get_progress(self):
+        """ (medium, bytes done, total or None, rate) of running downloads """
+        with self.mutex:
+            return [(p['medium'], p['done'] or 0, p['total'], p['rate'])
+                    for p in self.progress.values()]
+
     def cancel_download(self, medium):
-        self.cancel_requests[medium['link']] = True
+        with self.mutex:
+            if medium['link'] in self.cancel_pipes:
+                self.cancel_pipes[medium['link']].send_bytes(b'')
+            else:
+                self.cancel_requests[medium['link']] = True
+            self.dead_letters = [d for d in self.dead_letters
+                                 if d[0] is not medium]
+        self.attempts.pop(medium['link'], None)
         medium['location'] = 'remote'
         self.db.update_media([medium])
+        self.db.remove_download(medium)
 
 
 def search_media(search, source, print_infos, get_info=False, count=50):
@@ -15,6 +15,32 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import urllib.error
+import http.client
+
 
 class DownloadError(Exception):
     pass
+
+
+class HostError(DownloadError):
+    """ Download failed because of the host (unreachable, timeout,
+    overloaded) and not because of the medium itself """
+    pass
+
+
+def is_host_failure(error):
+    """ Whether error (or the error causing it) is a connection failure,
+    a server error or a rate limit """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code >= 500 or error.code == 429
+        if isinstance(error, (OSError, http.client.HTTPException)):
+            return True
+        # Wrapped by youtube-dl (DownloadError, ExtractorError)
+        exc_info = getattr(error, 'exc_info', None)
+        error = (exc_info[1] if exc_info
+                 else getattr(error, 'cause', None) or error.__cause__)
+    return False
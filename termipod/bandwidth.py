@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Bandwidth shared by all transfers (token bucket in shared memory, so
+that download processes are limited too) and connections per host """
+import os
+import fcntl
+import tempfile
+import urllib.request
+from urllib.parse import urlsplit
+import multiprocessing
+from time import time, sleep
+from contextlib import contextmanager
+
+import termipod.config as Config
+
+
+# Part of the bucket downloads leave to other classes: interactive
+# transfers (thumbnails) never wait, feeds wait for an empty bucket
+reserves = {
+    'interactive': None,
+    'feed': 0,
+    'download': 0.25,
+}
+config_params = ('Global.bandwidth_limit', 'Global.host_connections')
+
+# Shared with download processes (created before they are forked)
+mutex = multiprocessing.Lock()
+limit = multiprocessing.Value('d', -1, lock=False)  # bytes/s, -1: unset
+tokens = multiprocessing.Value('d', 0, lock=False)
+last = multiprocessing.Value('d', 0, lock=False)
+host_connections = multiprocessing.Value('i', 0, lock=False)
+
+
+def update_config():
+    """ Apply limits from configuration (for running downloads too) """
+    with mutex:
+        limit.value = Config.get('Global.bandwidth_limit')*1024
+        tokens.value = min(tokens.value, limit.value)
+        host_connections.value = max(1,
+                                     Config.get('Global.host_connections'))
+
+
+def consume(nbytes, priority='download'):
+    """ Wait until nbytes can be transferred by priority class. Bucket can
+    go in debt so that chunks bigger than the limit can pass """
+    if limit.value < 0:
+        update_config()
+    if not limit.value:
+        return
+
+    while True:
+        with mutex:
+            rate = limit.value
+            if not rate:
+                return
+            now = time()
+            tokens.value = min(rate, tokens.value+(now-last.value)*rate)
+            last.value = now
+
+            reserve = reserves[priority]
+            threshold = reserve*rate if reserve is not None else None
+            if threshold is None or tokens.value >= threshold:
+                tokens.value -= nbytes
+                return
+            delay = (threshold-tokens.value)/rate
+        sleep(delay)
+
+
+def get_host_slot(host, priority='download'):
+    """ File descriptor locking one of the connection slots of host (None
+    if all are taken). Locks are shared by all processes and released by
+    the kernel even if the process is killed. Downloads leave the last
+    slot to feeds (if there are several slots) """
+    if limit.value < 0:
+        update_config()
+
+    directory = os.path.join(tempfile.gettempdir(),
+                             f'termipod-{os.getuid()}')
+    os.makedirs(directory, exist_ok=True)
+    nslots = host_connections.value
+    if priority == 'download':
+        nslots = max(1, nslots-1)
+    for i in range(nslots):
+        fd = os.open(os.path.join(directory, f'{host}-{i}'),
+                     os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except OSError:
+            os.close(fd)
+    return None
+
+
+def release_host_slot(fd):
+    if fd is not None:
+        os.close(fd)
+
+
+@contextmanager
+def host_connection(host, priority='download'):
+    """ Wait for a free connection slot of host. Interactive transfers
+    are short and not counted, they would wait for long downloads """
+    if priority == 'interactive':
+        yield
+        return
+
+    slot = get_host_slot(host, priority)
+    while slot is None:
+        sleep(0.1)
+        slot = get_host_slot(host, priority)
+    try:
+        yield
+    finally:
+        release_host_slot(slot)
+
+
+def read_url(url, priority, timeout=60, chunk_size=1 << 14):
+    """ Content of url, transferred within limits """
+    host = urlsplit(url).hostname
+    with host_connection(host, priority):
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            chunks = []
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                consume(len(chunk), priority)
+                chunks.append(chunk)
+    return b''.join(chunks)
@@ -18,13 +18,13 @@
 import os
 import os.path
 from pathlib import Path
-import urllib
 from collections import OrderedDict
 import hashlib
 from threading import Lock
 
 import termipod.config as Config
 from termipod.backends import get_download_func, DownloadError
+import termipod.httpdownload as httpdownload
 
 # Ordered dict by date, contains file size as value
 files = {}
@@ -91,8 +91,11 @@ def item_get_cache(item, what, print_infos, check_only=False):
 
             else:
                 try:
-                    urllib.request.urlretrieve(url, filepath)
-                except urllib.error.URLError:
+                    # Not resumed: no partial file left in cache
+                    httpdownload.download(url, filepath,
+                                          priority='interactive',
+                                          resume=False)
+                except DownloadError:
                     return ''
 
             file_size = os.stat(filepath).st_size
@@ -17,6 +17,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import re
 import shlex
+from bisect import bisect_left
 
 from termipod.utils import commastr_to_list
 
@@ -27,26 +28,40 @@ class Completer:
 
 
 class CommaListCompleter(Completer):
-    def complete(self, string, selected=''):
+    def __init__(self, values):
+        super().__init__(values)
+        # Prefix index: values starting with a prefix are contiguous
+        self.sorted_values = sorted(values)
+        self.shown_values = sorted(values, key=str.casefold)
+        self.ranks = {v: i for i, v in enumerate(self.shown_values)}
+
+    def get_candidates(self, string):
         values = commastr_to_list(string, remove_emtpy=False)
-        begin = values[:-1]
+        begin = set(values[:-1])
         lastword = values[-1]
-        candidates = [v for v in self.values
-                      if v.startswith(lastword) and v not in begin]
-        candidates.sort(key=str.casefold)
+
+        if not lastword:
+            candidates = [v for v in self.shown_values if v not in begin]
+        else:
+            start = bisect_left(self.sorted_values, lastword)
+            end = bisect_left(self.sorted_values, lastword+'\U0010ffff',
+                              start)
+            candidates = [v for v in self.sorted_values[start:end]
+                          if v not in begin]
+            candidates.sort(key=self.ranks.__getitem__)
+
+        return lastword, candidates
+
+    def complete(self, string, selected=''):
+        lastword, candidates = self.get_candidates(string)
         return {'replaced_token': lastword,
                 'candidates': candidates,
                 'helplines': candidates}
 
 
-class CommaListSizeCompleter(Completer):
+class CommaListSizeCompleter(CommaListCompleter):
     def complete(self, string, selected=''):
-        values = commastr_to_list(string, remove_emtpy=False)
-        begin = values[:-1]
-        lastword = values[-1]
-        candidates = [v for v in self.values
-                      if v.startswith(lastword) and v not in begin]
-        candidates.sort(key=str.casefold)
+        lastword, candidates = self.get_candidates(string)
         helps = [f'{c} ({self.values[c]})' for c in candidates]
         return {'replaced_token': lastword,
                 'candidates': candidates,
@@ -75,11 +90,11 @@ class CommandCompleter(Completer):
                 # If start as option, we avoid it being matched with matchall
                 # option
                 if l['value'].endswith('=') and p.startswith(l['value']):
-                    if re.match('^'+l['regex']+'$', p) is None:
+                    if l['match'](p) is None:
                         return None
 
                 else:
-                    if re.match('^'+l['regex']+'$', p) is None:
+                    if l['match'](p) is None:
                         if (l['position'] is not None
                                 and l['position'] != position):
                             return None
@@ -118,6 +133,7 @@ class CommandCompleter(Completer):
             'name': name,
             'value': name,
             'regex': name,
+            'match': re.compile(re.escape(name)).fullmatch,
             'position': None,
             'description': description,
             'next': [],
@@ -130,6 +146,7 @@ class CommandCompleter(Completer):
             'name': name,
             'value': value,
             'regex': regex,
+            'match': re.compile(regex).fullmatch,
             'description': description,
             'position': position,
             'repeat': repeat,
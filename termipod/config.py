@@ -69,6 +69,11 @@ def init(**kwargs):
             30,
             'Minute interval between updates (0 to disable)'
         ),
+        'Global.reconcile_minutes': (
+            10,
+            'Minute interval between checks of downloaded files '
+            '(0 to check only at start)'
+        ),
         'Global.httpserver_port': (
             8195,
             'Port of HTTP server'
@@ -101,6 +106,10 @@ def init(**kwargs):
             True,
             'Enable mouse usage (restart to apply)'
         ),
+        'Global.max_fps': (
+            60,
+            'Maximal number of screen updates per second'
+        ),
         'Global.thumbnail_max_total_mb': (
             256,
             'Max total size (in MB) before removing oldest cached thumbnails'
@@ -109,6 +118,62 @@ def init(**kwargs):
             4096,
             'Max total size (in MB) before removing oldest cached files'
         ),
+        'Global.auto_min_minutes': (
+            0,
+            'Minimal duration of automatically downloaded media '
+            '(0 to disable)'
+        ),
+        'Global.auto_max_minutes': (
+            0,
+            'Maximal duration of automatically downloaded media '
+            '(0 to disable)'
+        ),
+        'Global.auto_skip_categories': (
+            '',
+            'Comma separated channel categories never downloaded '
+            'automatically'
+        ),
+        'Global.auto_skip_pattern': (
+            '',
+            'Regex of titles never downloaded automatically'
+        ),
+        'Global.download_nthreads': (
+            2,
+            'Number of simultaneous downloads (restart to apply)'
+        ),
+        'Global.download_retries': (
+            3,
+            'Number of download attempts before giving up'
+        ),
+        'Global.download_retry_delay': (
+            30,
+            'Delay in seconds before a failed download is tried again, '
+            'doubled at each failure'
+        ),
+        'Global.download_youtube_nthreads': (
+            0,
+            'Maximal number of simultaneous youtube downloads '
+            '(0 for no limit)'
+        ),
+        'Global.download_rss_nthreads': (
+            0,
+            'Maximal number of simultaneous rss downloads (0 for no limit)'
+        ),
+        'Global.download_segments': (
+            1,
+            'Number of connections used to download big rss files '
+            '(1 to disable)'
+        ),
+        'Global.host_connections': (
+            4,
+            'Maximal number of connections to a host for downloads and '
+            'feeds (one is kept for feeds if more than one)'
+        ),
+        'Global.bandwidth_limit': (
+            0,
+            'Bandwidth in KiB/s shared by all transfers, thumbnails and '
+            'feeds first (0 for no limit)'
+        ),
         'Global.update_nthreads': (
             8,
             'Number of threads dedicated to update channels/media'
@@ -117,6 +182,36 @@ def init(**kwargs):
             {'current': -1, 'list': []},
             '** Automatic variable to save layout **'
         ),
+        'retention.max_size': (
+            0,
+            'Maximal size in MiB of downloaded media (0 for no limit): '
+            'played media then oldest ones are removed'
+        ),
+        'retention.channel_max_size': (
+            0,
+            'Maximal size in MiB of downloaded media of each channel '
+            '(0 for no limit)'
+        ),
+        'retention.channel_sizes': (
+            '',
+            'Maximal size in MiB of downloaded media by channel title, as '
+            '"title=size, title=size" (overrides channel_max_size)'
+        ),
+        'retention.max_days': (
+            0,
+            'Downloaded media older than this number of days are removed '
+            '(0 to keep them)'
+        ),
+        'retention.keep_unread': (
+            0,
+            'Number of most recent unread media of each channel never '
+            'removed'
+        ),
+        'retention.delete_played': (
+            False,
+            'Remove downloaded media once played (media read before '
+            'being downloaded are kept)'
+        ),
         'youtube.ip_version': (
             0,
             'IP version: 4 or 6. 0 for automatic value. '
@@ -272,6 +367,7 @@ def default_keymap_to_config():
         ('channels', 'E', 'channel_category'),
         ('channels', 'm', 'channel_mask'),
         ('channels', 'U', 'channel_force_update'),
+        ('channels', 'r', 'channel_read'),
 
         ('*', 'BUTTON1_CLICKED', 'move_line'),
         ('*', 'BUTTON1_DOUBLE_CLICKED', '~medium_playadd'),
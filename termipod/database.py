@@ -35,10 +35,15 @@ class DataBaseUpdateException(Exception):
 
 
 class DataBase:
+    # Media fields that can be changed in bulk
+    media_fields = ('duration', 'date', 'location', 'state', 'filename',
+                    'tags', 'thumbnail', 'size', 'mtime', 'played',
+                    'downloaded')
+
     def __init__(self, name, print_infos, updatedb=False):
         self.mutex = Lock()
         self.print_infos = print_infos
-        self.version = 9
+        self.version = 15
         # channels by url, useful to get the same object in media
         self.channels = {}
 
@@ -78,9 +83,38 @@ class DataBase:
                         tags TEXT,
                         description TEXT,
                         thumbnail TEXT,
+                        size INTEGER DEFAULT 0,
+                        mtime INTEGER DEFAULT 0,
+                        played INTEGER DEFAULT 0,
+                        downloaded INTEGER DEFAULT 0,
+                        PRIMARY KEY (url, cid)
+                    );
+                """)
+                self.conn.execute(
+                    "CREATE INDEX media_cid_state ON media (cid, state)")
+                self.conn.executescript("""
+                    CREATE TABLE downloads (
+                        url TEXT,
+                        cid INTEGER,
+                        priority INTEGER DEFAULT 0,
+                        attempts INTEGER DEFAULT 0,
+                        next_attempt INTEGER DEFAULT 0,
+                        bytes INTEGER DEFAULT 0,
+                        error TEXT DEFAULT '',
                         PRIMARY KEY (url, cid)
                     );
                 """)
+                self.conn.executescript("""
+                    CREATE TABLE files (
+                        filename TEXT PRIMARY KEY,
+                        hash TEXT,
+                        size INTEGER,
+                        url TEXT,
+                        validator TEXT
+                    );
+                    CREATE INDEX files_hash ON files (hash);
+                    CREATE INDEX files_url ON files (url);
+                """)
                 set_user_version(self.conn, self.version)
 
         else:
@@ -117,6 +151,10 @@ class DataBase:
             commastr_to_list(medium_list[8]) if medium_list[8] else [])
         data['description'] = medium_list[9]
         data['thumbnail'] = medium_list[10]
+        data['size'] = medium_list[11]
+        data['mtime'] = medium_list[12]
+        data['played'] = medium_list[13]
+        data['downloaded'] = medium_list[14]
 
         data['cid'] = channel_id
         channel = self.get_channel(channel_id)
@@ -132,7 +170,8 @@ class DataBase:
         return (link, medium['cid'], medium['title'], medium['date'],
                 medium['duration'], medium['location'], medium['state'],
                 medium['filename'], medium['tags'], medium['description'],
-                medium['thumbnail'])
+                medium['thumbnail'], medium['size'], medium['mtime'],
+                medium['played'], medium['downloaded'])
 
     def get_channel(self, channel_id):
         try:
@@ -260,6 +299,14 @@ class DataBase:
                         medium['tags'] = ''
                     if 'thumbnail' not in medium:
                         medium['thumbnail'] = ''
+                    if 'size' not in medium:
+                        medium['size'] = 0
+                    if 'mtime' not in medium:
+                        medium['mtime'] = 0
+                    if 'played' not in medium:
+                        medium['played'] = 0
+                    if 'downloaded' not in medium:
+                        medium['downloaded'] = 0
                     new_entry = self.medium_to_list(medium)
 
                     # Check medium was not already in db
@@ -348,7 +395,11 @@ class DataBase:
                         state = ?,
                         filename = ?,
                         tags = ?,
-                        thumbnail = ?
+                        thumbnail = ?,
+                        size = ?,
+                        mtime = ?,
+                        played = ?,
+                        downloaded = ?
                     WHERE url = ? and cid = ?"""
         entries = []
         for medium in media:
@@ -364,12 +415,21 @@ class DataBase:
                 medium['tags'] = ''
             if 'thumbnail' not in medium:
                 medium['thumbnail'] = ''
+            if 'size' not in medium:
+                medium['size'] = 0
+            if 'mtime' not in medium:
+                medium['mtime'] = 0
+            if 'played' not in medium:
+                medium['played'] = 0
+            if 'downloaded' not in medium:
+                medium['downloaded'] = 0
             link = backends.shrink_link(medium['channel'], medium['link'])
             entry = (
                 medium['duration'], medium['date'], medium['location'],
                 medium['state'], medium['filename'],
                 list_to_commastr(medium['tags']), medium['thumbnail'],
-                link, medium['cid']
+                medium['size'], medium['mtime'], medium['played'],
+                medium['downloaded'], link, medium['cid']
             )
             entries.append(entry)
 
@@ -379,6 +439,146 @@ class DataBase:
         if not ret.rowcount:
             raise DataBaseUpdateException('Cannot update media')
 
+    def media_to_keys(self, media):
+        return [(backends.shrink_link(m['channel'], m['link']), m['cid'])
+                for m in media]
+
+    def fields_to_sql(self, fields):
+        columns = []
+        values = []
+        for field, value in fields.items():
+            if field not in self.media_fields:
+                raise ValueError(f'Cannot set field "{field}"')
+            if field == 'tags':
+                value = list_to_commastr(value)
+            columns.append(f'{field} = ?')
+            values.append(value)
+        return ', '.join(columns), values
+
+    def update_media_fields(self, media, fields):
+        """ Set the same fields on all media with a single UPDATE """
+        if not media:
+            return
+
+        columns, values = self.fields_to_sql(fields)
+        keys = self.media_to_keys(media)
+
+        # Keys go through a temporary table so that the update is one
+        # indexed join whatever the number of media
+        sql = f"""UPDATE media SET {columns}
+                    WHERE rowid IN (
+                        SELECT media.rowid FROM temp.media_keys AS k
+                        JOIN media ON media.url = k.url AND media.cid = k.cid
+                    )"""
+        with self.mutex, self.conn:
+            self.conn.execute("""CREATE TEMP TABLE IF NOT EXISTS media_keys (
+                                    url TEXT,
+                                    cid INTEGER,
+                                    PRIMARY KEY (url, cid)
+                                 )""")
+            self.conn.execute('DELETE FROM temp.media_keys')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO temp.media_keys VALUES (?, ?)', keys)
+            ret = self.conn.execute(sql, values)
+
+        if not ret.rowcount:
+            raise DataBaseUpdateException('Cannot update media')
+
+    def update_channel_media_fields(self, cids, fields, state=None):
+        """ Set the same fields on all media of channels (optionally only
+        those with given state) with a single UPDATE """
+        if not cids:
+            return 0
+
+        columns, values = self.fields_to_sql(fields)
+        sql = (f'UPDATE media SET {columns} '
+               f'WHERE cid IN ({",".join("?"*len(cids))})')
+        values.extend(cids)
+        if state is not None:
+            sql += ' AND state = ?'
+            values.append(state)
+
+        with self.mutex, self.conn:
+            ret = self.conn.execute(sql, values)
+
+        return ret.rowcount
+
+    def select_downloads(self):
+        """ Download queue, in download order """
+        cursor = self.conn.execute("""SELECT * FROM downloads
+                ORDER BY priority DESC, rowid""")
+        return list(map(self.list_to_download, cursor.fetchall()))
+
+    def list_to_download(self, download_list):
+        data = {}
+        data['url'] = download_list[0]
+        data['cid'] = download_list[1]
+        data['priority'] = download_list[2]
+        data['attempts'] = download_list[3]
+        data['next_attempt'] = download_list[4]
+        data['bytes'] = download_list[5]
+        data['error'] = download_list[6]
+
+        channel = self.get_channel(data['cid'])
+        if channel is None:
+            data['link'] = download_list[0]
+        else:
+            data['link'] = backends.expand_link(channel, download_list[0])
+        return data
+
+    def add_download(self, medium, priority=0):
+        """ Mark medium as being downloaded and queue it (kept as is if
+        already queued), in the same transaction """
+        link = backends.shrink_link(medium['channel'], medium['link'])
+        with self.mutex, self.conn:
+            self.conn.execute(
+                "UPDATE media SET location = 'download' "
+                "WHERE url = ? AND cid = ?", (link, medium['cid']))
+            self.conn.execute(
+                "INSERT OR IGNORE INTO downloads (url, cid, priority) "
+                "VALUES (?, ?, ?)", (link, medium['cid'], priority))
+
+    def update_download(self, medium, attempts, next_attempt, nbytes,
+                        error):
+        link = backends.shrink_link(medium['channel'], medium['link'])
+        with self.mutex, self.conn:
+            self.conn.execute(
+                """UPDATE downloads
+                    SET attempts = ?, next_attempt = ?, bytes = ?, error = ?
+                    WHERE url = ? and cid = ?""",
+                (attempts, next_attempt, nbytes, error, link, medium['cid']))
+
+    def remove_download(self, medium):
+        link = backends.shrink_link(medium['channel'], medium['link'])
+        self.remove_downloads([(link, medium['cid'])])
+
+    def remove_downloads(self, keys):
+        """ Remove downloads from (url, cid) as stored in database """
+        with self.mutex, self.conn:
+            self.conn.executemany(
+                "DELETE FROM downloads WHERE url = ? and cid = ?", keys)
+
+    def find_files(self, column, value):
+        """ Downloaded files with same content hash or url """
+        if column not in ('hash', 'url'):
+            raise ValueError(f'Cannot search files by "{column}"')
+        cursor = self.conn.execute(
+            f"SELECT * FROM files WHERE {column} = ?", (value,))
+        return [dict(zip(('filename', 'hash', 'size', 'url', 'validator'),
+                         row)) for row in cursor.fetchall()]
+
+    def add_file(self, filename, digest, size, url, validator):
+        with self.mutex, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (filename, digest, size, url, validator))
+
+    def remove_files(self, filenames):
+        with self.mutex, self.conn:
+            self.conn.executemany(
+                "DELETE FROM files WHERE filename = ?",
+                [(f,) for f in filenames])
+
     def channel_get_unread_media(self, cid):
         cursor = self.conn.execute(
             "SELECT * FROM media WHERE cid=? AND state='unread'",
@@ -405,3 +605,7 @@ class DataBase:
                 # Remove media
                 sql = "DELETE FROM media where cid = ?"
                 self.conn.execute(sql, [cid])
+
+                # Remove queued downloads
+                sql = "DELETE FROM downloads where cid = ?"
+                self.conn.execute(sql, [cid])
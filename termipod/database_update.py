@@ -152,6 +152,73 @@ def update_version(conn, version):
                     "DEFAULT ''")
                 set_user_version(conn, 9)
 
+        if 9 == get_user_version(conn):
+            with conn:
+                conn.execute(
+                    "CREATE INDEX media_cid_state ON media (cid, state)")
+                set_user_version(conn, 10)
+
+        if 10 == get_user_version(conn):
+            with conn:
+                conn.execute(
+                    "ALTER TABLE media ADD COLUMN 'size' 'INTEGER' "
+                    "DEFAULT 0")
+                conn.execute(
+                    "ALTER TABLE media ADD COLUMN 'mtime' 'INTEGER' "
+                    "DEFAULT 0")
+                set_user_version(conn, 11)
+
+        if 11 == get_user_version(conn):
+            with conn:
+                conn.executescript("""
+                    CREATE TABLE downloads (
+                        url TEXT,
+                        cid INTEGER,
+                        priority INTEGER DEFAULT 0,
+                        attempts INTEGER DEFAULT 0,
+                        next_attempt INTEGER DEFAULT 0,
+                        bytes INTEGER DEFAULT 0,
+                        error TEXT DEFAULT '',
+                        PRIMARY KEY (url, cid)
+                    );
+                """)
+                # Media waiting for download are queued again
+                conn.execute("""
+                    INSERT INTO downloads (url, cid)
+                        SELECT url, cid FROM media
+                        WHERE location = 'download' ORDER BY date
+                """)
+                set_user_version(conn, 12)
+
+        if 12 == get_user_version(conn):
+            with conn:
+                conn.executescript("""
+                    CREATE TABLE files (
+                        filename TEXT PRIMARY KEY,
+                        hash TEXT,
+                        size INTEGER,
+                        url TEXT,
+                        validator TEXT
+                    );
+                    CREATE INDEX files_hash ON files (hash);
+                    CREATE INDEX files_url ON files (url);
+                """)
+                set_user_version(conn, 13)
+
+        if 13 == get_user_version(conn):
+            with conn:
+                conn.execute(
+                    "ALTER TABLE media ADD COLUMN 'played' 'INTEGER' "
+                    "DEFAULT 0")
+                set_user_version(conn, 14)
+
+        if 14 == get_user_version(conn):
+            with conn:
+                conn.execute(
+                    "ALTER TABLE media ADD COLUMN 'downloaded' 'INTEGER' "
+                    "DEFAULT 0")
+                set_user_version(conn, 15)
+
         if version != get_user_version(conn):
             print(version)
             print(get_user_version(conn))
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import json
+import urllib.request
+import urllib.error
+from urllib.parse import urlsplit
+import http.client
+from threading import Thread, Lock
+
+from termipod.backends_exceptions import (DownloadError, HostError,
+                                          is_host_failure)
+from termipod.utils import noop
+import termipod.config as Config
+import termipod.bandwidth as bandwidth
+
+
+chunk_size = 1 << 16
+timeout = 60
+# Smaller files are not worth several connections
+min_segmented_size = 8*1024**2
+
+
+def read_part_info(part):
+    """ Validator (ETag or Last-Modified) and total length of a partial
+    download, None if it cannot be resumed """
+    try:
+        with open(part+'.json') as f:
+            info = json.load(f)
+        if info['validator'] and os.path.getsize(part) <= info['length']:
+            return info
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def write_part_info(part, validator, length):
+    with open(part+'.json', 'w') as f:
+        json.dump({'validator': validator, 'length': length}, f)
+
+
+def remove_part(part):
+    for filename in (part, part+'.json'):
+        try:
+            os.unlink(filename)
+        except FileNotFoundError:
+            pass
+
+
+def download_segments(url, response, part, total, validator, progress,
+                      priority):
+    """ Download url with several connections (first range is read from
+    response), each writing its range in the preallocated part file.
+    Returns False if no other connection to host is allowed """
+    host = urlsplit(url).hostname
+    slots = []
+    for i in range(Config.get('Global.download_segments')-1):
+        slot = bandwidth.get_host_slot(host)
+        if slot is None:
+            break
+        slots.append(slot)
+    if not slots:
+        return False
+
+    nsegments = len(slots)+1
+    bounds = [total*i//nsegments for i in range(nsegments+1)]
+    failed = []
+    # Bytes written by all connections
+    done = [0]
+    done_mutex = Lock()
+
+    def fetch(start, end, response=None):
+        position = start
+        try:
+            if response is None:
+                request = urllib.request.Request(url, headers={
+                    'Range': f'bytes={start}-{end-1}',
+                    'If-Range': validator,
+                })
+                response = urllib.request.urlopen(request, timeout=timeout)
+                if (response.getcode() != 206
+                        or not response.headers.get(
+                            'Content-Range', '').startswith(
+                                f'bytes {start}-')):
+                    response.close()
+                    raise DownloadError(f'Bad range from {url}')
+
+            with response:
+                while position < end:
+                    chunk = response.read(min(chunk_size, end-position))
+                    if not chunk:
+                        break
+                    bandwidth.consume(len(chunk), priority)
+                    os.pwrite(fd, chunk, position)
+                    position += len(chunk)
+                    with done_mutex:
+                        done[0] += len(chunk)
+                        progress(done[0], total)
+            if position != end:
+                raise DownloadError(f'Download of {url} incomplete')
+        except (DownloadError, OSError, http.client.HTTPException):
+            failed.append((position, end))
+
+    fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        # Preallocate (sparse if filesystem cannot allocate)
+        try:
+            os.posix_fallocate(fd, 0, total)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, total)
+
+        threads = [Thread(target=fetch, args=(bounds[i], bounds[i+1]))
+                   for i in range(1, nsegments)]
+        for thread in threads:
+            thread.start()
+        fetch(bounds[0], bounds[1], response)
+        for thread in threads:
+            thread.join()
+
+        # Fallback: failed ranges are downloaded again one by one
+        for start, end in failed[:]:
+            failed.remove((start, end))
+            fetch(start, end)
+        if failed:
+            raise HostError(f'Download of {url} incomplete')
+    finally:
+        os.close(fd)
+        for slot in slots:
+            bandwidth.release_host_slot(slot)
+
+    return True
+
+
+def download(url, filename, progress=noop, priority='download',
+             resume=True):
+    """ Download url into filename.part, renamed once complete, calling
+    progress(bytes done, total or None) after each chunk
+
+    Waits for a connection slot to host (except interactive transfers),
+    and bandwidth is shared with other transfers by priority class (see
+    bandwidth module).
+
+    A partial download left by a failure is resumed (Range and If-Range
+    headers) if the server still has the same file. Returns validator
+    (ETag or Last-Modified) of downloaded file, raises DownloadError
+    (partial file is kept if resume is True) """
+    with bandwidth.host_connection(urlsplit(url).hostname, priority):
+        try:
+            return download_connected(url, filename, progress, priority,
+                                      resume)
+        except DownloadError:
+            if not resume:
+                remove_part(filename+'.part')
+            raise
+
+
+def download_connected(url, filename, progress, priority, resume):
+    """ Download once connection slot to host is held """
+    part = filename+'.part'
+    info = read_part_info(part) if resume else None
+    offset = os.path.getsize(part) if info is not None else 0
+
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header('Range', f'bytes={offset}-')
+        request.add_header('If-Range', info['validator'])
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        # Nothing after offset: already complete or changed on server
+        if e.code == 416 and offset and offset == info['length']:
+            os.replace(part, filename)
+            remove_part(part)
+            return info['validator']
+        # Invalid range, other errors (503, 429...) keep partial file
+        if e.code == 416:
+            remove_part(part)
+        if is_host_failure(e):
+            raise HostError(f'Cannot download {url}: {e}')
+        raise DownloadError(f'Cannot download {url}: {e}')
+    except (urllib.error.URLError, OSError) as e:
+        raise HostError(f'Cannot download {url}: {e}')
+
+    with response:
+        headers = response.headers
+        length = headers.get('Content-Length')
+        length = int(length) if length is not None else None
+
+        # Server ignored range (or file changed): start again
+        if response.getcode() != 206:
+            offset = 0
+        elif not headers.get('Content-Range', '').startswith(
+                f'bytes {offset}-'):
+            remove_part(part)
+            raise DownloadError(f'Bad range from {url}')
+
+        total = offset+length if length is not None else None
+        validator = headers.get('ETag') or headers.get('Last-Modified')
+
+        # Segmented part cannot be resumed: removed on failure
+        segmented = (Config.get('Global.download_segments') > 1
+                     and not offset and validator
+                     and total is not None and total >= min_segmented_size
+                     and headers.get('Accept-Ranges') == 'bytes')
+
+        if resume and validator and total is not None and not segmented:
+            write_part_info(part, validator, total)
+        else:
+            # Cannot be resumed safely
+            remove_part(part)
+
+        written = offset
+        try:
+            if segmented and download_segments(url, response, part, total,
+                                               validator, progress, priority):
+                written = total
+            else:
+                if segmented:
+                    # Single connection to host: can be resumed
+                    if resume:
+                        write_part_info(part, validator, total)
+                    segmented = False
+                progress(written, total)
+                with open(part, 'r+b' if offset else 'wb') as f:
+                    f.seek(offset)
+                    f.truncate()
+                    while True:
+                        chunk = response.read(chunk_size)
+                        if not chunk:
+                            break
+                        bandwidth.consume(len(chunk), priority)
+                        f.write(chunk)
+                        written += len(chunk)
+                        progress(written, total)
+        except DownloadError:
+            if segmented:
+                remove_part(part)
+            raise
+        except (OSError, http.client.HTTPException) as e:
+            raise HostError(f'Download of {url} interrupted: {e}')
+
+    if total is not None and written != total:
+        raise HostError(
+            f'Download of {url} incomplete ({written}/{total} bytes)')
+
+    os.replace(part, filename)
+    remove_part(part)
+    return validator
+
+
+def get_validator(url):
+    """ ETag or Last-Modified of url (None if unknown) """
+    request = urllib.request.Request(url, method='HEAD')
+    try:
+        # Short request: can use the slot downloads leave to feeds
+        with bandwidth.host_connection(urlsplit(url).hostname, 'feed'):
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                headers = response.headers
+    except (urllib.error.URLError, OSError, http.client.HTTPException):
+        return None
+    return headers.get('ETag') or headers.get('Last-Modified')
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from bisect import bisect_right
+from itertools import accumulate, chain
+
+
+class IndexedList:
+    """ Sequence of unique hashable values with fast lookup by value
+
+    Values are stored in blocks of bounded size, so that insertion and
+    deletion only move a block, and a map gives the block of each value so
+    that index() does not scan the whole sequence
+
+    When reverse is set, the sequence is seen backwards (positions, index()
+    and iteration) without moving anything; append() and extend*() work on
+    the underlying order """
+    load = 256
+
+    def __init__(self, values=(), reverse=False):
+        self.reverse = reverse
+        self.version = 0  # changed by each modification
+        self.clear()
+        self.extend(values)
+
+    def clear(self):
+        self.blocks = []
+        self.block_of = {}  # value -> block
+        self.block_pos = {}  # id(block) -> position in self.blocks
+        self.offsets = None  # first position of each block (lazy)
+        self.size = 0
+        self.version += 1
+
+    def _blocks_changed(self):
+        self.version += 1
+        self.block_pos = {id(b): i for i, b in enumerate(self.blocks)}
+        self.offsets = None
+
+    def _get_offsets(self):
+        if self.offsets is None:
+            self.offsets = [0]
+            self.offsets.extend(
+                accumulate(len(b) for b in self.blocks[:-1]))
+        return self.offsets
+
+    def _locate(self, position):
+        if position < 0:
+            position += self.size
+        if not 0 <= position < self.size:
+            raise IndexError('IndexedList index out of range')
+        if self.reverse:
+            position = self.size-1-position
+
+        offsets = self._get_offsets()
+        block_idx = bisect_right(offsets, position)-1
+        return block_idx, position-offsets[block_idx]
+
+    def _new_blocks(self, values):
+        blocks = [values[i:i+self.load]
+                  for i in range(0, len(values), self.load)]
+        for block in blocks:
+            for value in block:
+                self.block_of[value] = block
+        return blocks
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        if self.reverse:
+            return chain.from_iterable(reversed(b) for b in self.blocks[::-1])
+        return chain.from_iterable(self.blocks)
+
+    def __contains__(self, value):
+        return value in self.block_of
+
+    def __getitem__(self, position):
+        block_idx, idx = self._locate(position)
+        return self.blocks[block_idx][idx]
+
+    def __delitem__(self, position):
+        block_idx, idx = self._locate(position)
+        block = self.blocks[block_idx]
+        value = block.pop(idx)
+        del self.block_of[value]
+        self.size -= 1
+        self.version += 1
+
+        if not block:
+            del self.blocks[block_idx]
+            self._blocks_changed()
+        else:
+            self.offsets = None
+
+    def index(self, value):
+        try:
+            block = self.block_of[value]
+        except KeyError:
+            raise ValueError(f'{value} is not in IndexedList')
+        block_idx = self.block_pos[id(block)]
+        position = self._get_offsets()[block_idx]+block.index(value)
+        if self.reverse:
+            return self.size-1-position
+        return position
+
+    def remove(self, value):
+        del self[self.index(value)]
+
+    def insert(self, position, value):
+        if position < 0:
+            position = max(0, position+self.size)
+        position = min(position, self.size)
+        if self.reverse:
+            position = self.size-position
+
+        if position == self.size:
+            self.append(value)
+        else:
+            block_idx, idx = self._locate(
+                self.size-1-position if self.reverse else position)
+            self._insert_in_block(block_idx, idx, value)
+
+    def insert_sorted(self, value, key):
+        """ Insert value keeping the underlying order sorted by key """
+        k = key(value)
+        blocks = self.blocks
+
+        # First block whose last value is after the new one
+        lo, hi = 0, len(blocks)
+        while lo < hi:
+            mid = (lo+hi)//2
+            if k < key(blocks[mid][-1]):
+                hi = mid
+            else:
+                lo = mid+1
+        if lo == len(blocks):
+            self.append(value)
+            return
+
+        block = blocks[lo]
+        first, last = 0, len(block)
+        while first < last:
+            mid = (first+last)//2
+            if k < key(block[mid]):
+                last = mid
+            else:
+                first = mid+1
+        self._insert_in_block(lo, first, value)
+
+    def _insert_in_block(self, block_idx, idx, value):
+        block = self.blocks[block_idx]
+        block.insert(idx, value)
+        self.block_of[value] = block
+        self.size += 1
+        self.version += 1
+
+        # Split big blocks
+        if len(block) > 2*self.load:
+            new_block = block[self.load:]
+            del block[self.load:]
+            for v in new_block:
+                self.block_of[v] = new_block
+            self.blocks.insert(block_idx+1, new_block)
+            self._blocks_changed()
+        else:
+            self.offsets = None
+
+    def append(self, value):
+        if not self.blocks or len(self.blocks[-1]) >= self.load:
+            self.blocks.append([])
+            self._blocks_changed()
+        else:
+            self.offsets = None
+        self.blocks[-1].append(value)
+        self.block_of[value] = self.blocks[-1]
+        self.size += 1
+        self.version += 1
+
+    def extend(self, values):
+        values = list(values)
+        if not values:
+            return
+        self.blocks.extend(self._new_blocks(values))
+        self.size += len(values)
+        self._blocks_changed()
+
+    def extendleft(self, values):
+        """ Same as deque.extendleft: values end in reverse order """
+        values = list(values)[::-1]
+        if not values:
+            return
+        self.blocks[:0] = self._new_blocks(values)
+        self.size += len(values)
+        self._blocks_changed()
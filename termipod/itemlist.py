@@ -15,22 +15,25 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-import re
 import operator
 import os
 import time
+from bisect import bisect_left, insort
 from collections import deque, Counter
 from threading import Thread, Lock
 
 import os.path
 
 import termipod.backends as backends
+import termipod.probe as probe
 import termipod.player as player
 from termipod.database import DataBase, DataBaseUpdateException
 from termipod.utils import (options_string_to_dict, commastr_to_list,
                             noop, run_all)
 import termipod.config as Config
 import termipod.playlist as Playlist
+from termipod.rules import AutoRules
+from termipod.retention import Retention
 from termipod.database import DataBaseVersionException
 
 
@@ -41,6 +44,7 @@ class ItemListException(Exception):
 class CallbackDeque(deque):
     def __init__(self, *args, **kwargs):
         self.callbacks = []
+        self.orderings = {}
         super().__init__(*args, **kwargs)
 
     def extend(self, items):
@@ -60,6 +64,173 @@ class CallbackDeque(deque):
         run_all(self.callbacks, ('new', items))
 
 
+class Ordering:
+    """ Indices of list items sorted by a key, updated with list events
+
+    col is either a field name or a function of the item """
+    def __init__(self, itemlist, col):
+        self.col = col
+        self.keys = {}  # item index -> (key, index)
+        self.order = []  # sorted keys
+        self.mutex = Lock()
+        self.add(itemlist)
+
+    def item_key(self, item):
+        if callable(self.col):
+            key = self.col(item)
+        else:
+            key = item[self.col]
+            if isinstance(key, str):
+                key = key.casefold()
+        if key is None:
+            key = 0
+        return (key, item['index'])
+
+    def add(self, items):
+        with self.mutex:
+            keys = [self.item_key(item) for item in items]
+            for key in keys:
+                self.keys[key[1]] = key
+            if len(keys) > 16:
+                self.order.extend(keys)
+                self.order.sort()
+            else:
+                for key in keys:
+                    insort(self.order, key)
+
+    def modify(self, items):
+        with self.mutex:
+            for item in items:
+                if 'index' not in item:
+                    continue
+                key = self.item_key(item)
+                old_key = self.keys.get(key[1])
+                if old_key == key:
+                    continue
+                if old_key is not None:
+                    del self.order[bisect_left(self.order, old_key)]
+                self.keys[key[1]] = key
+                insort(self.order, key)
+
+    def reset(self, itemlist):
+        with self.mutex:
+            self.keys = {}
+            self.order = []
+        self.add(itemlist)
+
+    def get_key(self, idx):
+        return self.keys[idx]
+
+    def indices(self):
+        """ Item indices in increasing key order """
+        with self.mutex:
+            return [key[1] for key in self.order]
+
+    def indices_below(self, key):
+        """ Indices of items with a lower key, in increasing key order """
+        with self.mutex:
+            end = bisect_left(self.order, (key,))
+            return [k[1] for k in self.order[:end]]
+
+
+def bitset_to_indices(bitset):
+    """ Positions of set bits, in increasing order """
+    indices = []
+    data = bitset.to_bytes((bitset.bit_length()+7)//8, 'little')
+    for byte_idx, byte in enumerate(data):
+        if byte:
+            base = byte_idx*8
+            indices.extend(base+bit for bit in _byte_bits[byte])
+    return indices
+
+
+_byte_bits = [[bit for bit in range(8) if byte >> bit & 1]
+              for byte in range(256)]
+
+
+class MediaIndex:
+    """ Inverted index of media: one bitset (int with a bit per item index)
+    for each state, location, channel id and tag, updated with list events
+    so that filters are bitset intersections """
+    def __init__(self, itemlist):
+        self.mutex = Lock()
+        self.reset(itemlist)
+
+    def item_values(self, item):
+        return (('state', item['state']), ('location', item['location']),
+                ('cid', item['cid'])) + tuple(('tag', t) for t in item['tags'])
+
+    def reset(self, itemlist):
+        # Bitsets are first built as bytearrays, setting bits in an int one
+        # by one would copy it each time
+        arrays = {}
+        size = (len(itemlist)+7)//8
+        with self.mutex:
+            self.values = {}
+            for item in itemlist:
+                idx = item['index']
+                values = self.item_values(item)
+                self.values[idx] = values
+                for value in values:
+                    try:
+                        array = arrays[value]
+                    except KeyError:
+                        array = arrays[value] = bytearray(size)
+                    array[idx >> 3] |= 1 << (idx & 7)
+
+            self.bitsets = {k: int.from_bytes(a, 'little')
+                            for k, a in arrays.items()}
+            self.all = int.from_bytes(b'\xff'*size, 'little')
+
+    def update(self, items):
+        with self.mutex:
+            for item in items:
+                if 'index' not in item:
+                    continue
+                idx = item['index']
+                bit = 1 << idx
+                old_values = self.values.get(idx, ())
+                values = self.item_values(item)
+                if old_values == values:
+                    continue
+                for value in set(old_values)-set(values):
+                    self.bitsets[value] &= ~bit
+                for value in set(values)-set(old_values):
+                    self.bitsets[value] = self.bitsets.get(value, 0) | bit
+                self.values[idx] = values
+                self.all |= bit
+
+    def get(self, field, value):
+        return self.bitsets.get((field, value), 0)
+
+    def any_of(self, field, values):
+        bitset = 0
+        for value in values:
+            bitset |= self.get(field, value)
+        return bitset
+
+    def select(self, state=None, location=None, cids=None, tags=None):
+        """ Bitset of media matching all given criteria (None to ignore) """
+        with self.mutex:
+            bitset = self.all
+            if state is not None:
+                bitset &= self.get('state', state)
+            if location is not None:
+                bitset &= self.get('location', location)
+            if cids is not None:
+                bitset &= self.any_of('cid', cids)
+            if tags is not None:
+                for tag in tags:
+                    bitset &= self.get('tag', tag)
+        return bitset
+
+    def tag_counts(self):
+        with self.mutex:
+            return Counter({value: bin(bitset).count('1')
+                            for (field, value), bitset in self.bitsets.items()
+                            if field == 'tag' and bitset})
+
+
 class ItemLists():
     def __init__(self, print_infos, wait=False, updatedb=False):
         self.db_name = Config.get('Global.db_path')
@@ -75,6 +246,11 @@ class ItemLists():
         self.update_mutex = Lock()
         self.download_manager = None
         self.player = None
+        self.media_index = None
+        # media by (link, cid), to find queued downloads
+        self.media_by_key = {}
+        # Files whose duration cannot be found
+        self.unprobed = set()
 
         # item lists
         self.media = CallbackDeque()
@@ -82,12 +258,12 @@ class ItemLists():
 
         self.add_channels()
         self.add_media()
+        self.retention = Retention(self)
 
-        # Mark removed files as read
-        for medium in self.media:
-            if ('local' == medium['location'] and
-                    not os.path.isfile(medium['filename'])):
-                self.remove_media([medium], unlink=False)
+        # Check downloaded files in background (slow on network mounts)
+        reconciler = Thread(target=self.reconcile_task)
+        reconciler.daemon = True
+        reconciler.start()
 
     def get_list(self, list_class, callback=noop):
         if list_class == 'media':
@@ -102,13 +278,52 @@ class ItemLists():
         itemlist.callbacks.append(callback)
         return itemlist
 
+    def get_ordering(self, itemlist, name, col):
+        """ Ordering of itemlist by col, shared by all areas using name and
+        kept sorted with list events """
+        try:
+            return itemlist.orderings[name]
+        except KeyError:
+            pass
+
+        ordering = Ordering(itemlist, col)
+
+        def update(state, items):
+            if state == 'new':
+                ordering.add(items)
+            elif state == 'modified':
+                ordering.modify(items)
+            elif state == 'removed':
+                ordering.reset(itemlist)
+
+        # Orderings need to be updated before areas
+        itemlist.callbacks.insert(0, update)
+        itemlist.orderings[name] = ordering
+        return ordering
+
+    def get_media_index(self):
+        if self.media_index is None:
+            index = MediaIndex(self.media)
+
+            def update(state, items):
+                if state == 'removed':
+                    index.reset(self.media)
+                else:
+                    index.update(items)
+
+            # Index needs to be updated before areas
+            self.media.callbacks.insert(0, update)
+            self.media_index = index
+
+        return self.media_index
+
     def close_list(self, itemlist, callback=noop):
         itemlist.callbacks.remove(callback)
         if itemlist is self.media:
             pass
         elif itemlist is self.channels:
             pass
-        elif not itemlist.callbacks:
+        elif len(itemlist.callbacks) == len(itemlist.orderings):
             del itemlist
 
     def get_callbacks(self, itemlist):
@@ -185,7 +400,10 @@ class ItemLists():
                 mi_to_remove.sort(reverse=True)
                 num_media += len(mi_to_remove)
                 for mi in mi_to_remove:
-                    media.append(self.media[mi])
+                    medium = self.media[mi]
+                    media.append(medium)
+                    self.media_by_key.pop((medium['link'], medium['cid']),
+                                          None)
                     del self.media[mi]
 
             self.media_update_index()
@@ -209,6 +427,8 @@ class ItemLists():
             media.reverse()
             self.media.extend(media)
 
+        self.media_by_key.update(((m['link'], m['cid']), m) for m in media)
+
         if update_channel:
             for m in media:
                 m['channel']['media'].appendleft(m)
@@ -225,11 +445,36 @@ class ItemLists():
             self.download_marked()
 
     def download_marked(self):
-        for medium in self.media:
-            if 'download' == medium['location']:
-                self.download_manager.add(medium, update=False)
+        """ Queue again downloads of previous run, in their order """
+        dm = self.download_manager
+        stale = []
+        for download in self.db.select_downloads():
+            key = (download['link'], download['cid'])
+            medium = self.media_by_key.get(key)
+            if medium is None or medium['location'] != 'download':
+                stale.append((download['url'], download['cid']))
+            elif download['attempts'] < dm.max_retries:
+                dm.add(medium, update=False, priority=download['priority'],
+                       attempts=download['attempts'],
+                       next_attempt=download['next_attempt'])
+            else:
+                dm.add_dead_letter(medium, download['error'])
+        if stale:
+            self.db.remove_downloads(stale)
+
         if self.wait:
-            self.wait_done()
+            dm.wait_done()
+
+    def download_auto(self, channel, media):
+        """ Download media selected automatically, if they fit in disk
+        budgets (others are deferred) """
+        media = self.retention.admit(channel, media)
+        if media:
+            self.download_manager_init()
+            for medium in media:
+                self.download_manager.add(medium)
+            run_all(self.get_callbacks(self.media), ('modified', media))
+        return media
 
     def download(self, itemlist, media):
         if self.download_manager is None:
@@ -237,8 +482,12 @@ class ItemLists():
 
         for medium in media:
             if medium['location'] == 'remote':
+                # Asked by user: before automatic downloads, and kept by
+                # disk budgets
+                self.retention.request(medium)
                 self.download_manager.add(medium,
-                                          cb=self.get_callbacks(itemlist))
+                                          cb=self.get_callbacks(itemlist),
+                                          priority=1)
             elif medium['location'] == 'download':
                 self.download_manager.cancel_download(medium)
             else:
@@ -267,33 +516,120 @@ class ItemLists():
         self.player.stop()
 
     def switch_read(self, media, skip=False):
-        updated_media = []
-        original_media = []
-        for original_medium in media:
-            medium = original_medium.copy()
-
+        new_state = 'skipped' if skip else 'read'
+        unread_media = []
+        read_media = []
+        for medium in media:
             if medium['state'] in ('read', 'skipped'):
-                medium['state'] = 'unread'
+                unread_media.append(medium)
             else:
-                if skip:
-                    medium['state'] = 'skipped'
-                else:
-                    medium['state'] = 'read'
-
-            updated_media.append(medium)
-            original_media.append(original_medium)
+                read_media.append(medium)
 
         try:
-            self.update_media_data(original_media, updated_media)
+            self.set_media_fields(unread_media,
+                                  {'state': 'unread', 'played': 0})
+            # Time of reading, only skipped media are not played
+            fields = {'state': new_state}
+            if not skip:
+                fields['played'] = int(time.time())
+            self.set_media_fields(read_media, fields)
         except DataBaseUpdateException:
             self.print_infos('Cannot update database with updated media',
                              mode='error')
             return []
 
         self.print_infos('All media marked')
-        run_all(self.get_callbacks(self.media), ('modified', updated_media))
+        media = unread_media+read_media
+        run_all(self.get_callbacks(self.media), ('modified', media))
+
+        return media
+
+    def set_media_fields(self, media, fields):
+        """ Set the same values to all media, in database and in memory
+        Can raise DataBaseUpdateException """
+        if not media:
+            return
 
-        return updated_media
+        self.db.update_media_fields(media, fields)
+        for medium in media:
+            medium.update(fields)
+
+    def reconcile_files(self):
+        """ Mark media whose file was removed as read, and update size,
+        modification time and missing duration of other downloaded files """
+        while True:
+            try:
+                local_media = [m for m in self.media
+                               if 'local' == m['location']]
+                break
+            # In case media are modified during looping
+            except RuntimeError:
+                pass
+
+        removed_media = []
+        changed_media = []
+        for medium in local_media:
+            try:
+                stat = os.stat(medium['filename'])
+            except OSError:
+                removed_media.append(medium)
+                continue
+
+            changed = False
+            if (medium['size'] != stat.st_size
+                    or medium['mtime'] != int(stat.st_mtime)):
+                medium['size'] = stat.st_size
+                medium['mtime'] = int(stat.st_mtime)
+                changed = True
+
+            # Duration missing (e.g. ffprobe was missing at download)
+            if (not medium['duration']
+                    and medium['filename'] not in self.unprobed):
+                medium['duration'] = probe.get_duration(medium['filename'])
+                if medium['duration']:
+                    changed = True
+                else:
+                    self.unprobed.add(medium['filename'])
+
+            if changed:
+                changed_media.append(medium)
+
+        self.remove_media(removed_media, unlink=False)
+        if changed_media:
+            try:
+                self.db.update_media(changed_media)
+            except DataBaseUpdateException:
+                self.print_infos('Cannot update database with file data',
+                                 mode='error')
+            run_all(self.get_callbacks(self.media),
+                    ('modified', changed_media))
+
+    def reconcile_task(self):
+        while True:
+            self.reconcile_files()
+            # Age rule needs to be checked even without changes
+            self.retention.run()
+            minutes = Config.get('Global.reconcile_minutes')
+            if not minutes:
+                return
+            time.sleep(minutes*60)
+
+    def channel_set_media_state(self, channel_ids, new_state, state=None):
+        """ Set state of all media of channels (only media in state if
+        provided) """
+        channels = self.channel_ids_to_objects(channel_ids)
+        cids = [c['id'] for c in channels]
+        self.db.update_channel_media_fields(cids, {'state': new_state}, state)
+
+        media = [m for c in channels for m in c['media']
+                 if state is None or m['state'] == state]
+        for medium in media:
+            medium['state'] = new_state
+
+        self.print_infos(f'{len(media)} media marked as {new_state}')
+        run_all(self.get_callbacks(self.media), ('modified', media))
+        run_all(self.get_callbacks(self.channels), ('modified', channels))
+        return media
 
     def update_media(self, media, itemlist):
         if itemlist is self.media:
@@ -322,7 +658,8 @@ class ItemLists():
     def update_media_task(self, enum_media, size, itemlist, update_db=True):
         show_freq = 5
         updated_media = []
-        original_media = []
+        # Data before update, restored if database cannot be updated
+        previous_media = []
 
         update_to_show = []
         while True:
@@ -337,34 +674,35 @@ class ItemLists():
 
             self.print_infos(f'Update media {size-i}/{size}...')
             if backends.update_medium(medium, self.print_infos):
-                updated_media.append(medium)
-                original_media.append(original_medium)
+                # Areas format shown lines from list items, so they are
+                # updated before being shown
+                previous_media.append(original_medium.copy())
+                original_medium.update(medium)
+                updated_media.append(original_medium)
 
-                update_to_show.append(medium)
+                update_to_show.append(original_medium)
                 if len(update_to_show) == show_freq:
                     run_all(self.get_callbacks(itemlist),
                             ("modified", update_to_show))
                     update_to_show = []
 
         try:
-            self.update_media_data(original_media, updated_media,
-                                   update_db=update_db)
+            if update_db:
+                self.db.update_media(updated_media)
             self.print_infos('Done updating media')
         except DataBaseUpdateException:
             self.print_infos('Cannot update database with updated media.',
                              mode='error')
-            run_all(self.get_callbacks(itemlist), ("modified", original_media))
+            for updated, previous in zip(updated_media, previous_media):
+                updated.update(previous)
+            run_all(self.get_callbacks(itemlist), ("modified", updated_media))
 
     def remove_media(self, media, unlink=True,
                      mark_as_read=True):
         if not media:
             return
 
-        updated_media = []
-        original_media = []
-
-        for original_medium in media:
-            medium = original_medium.copy()
+        for medium in media:
             if unlink:
                 if '' == medium['filename']:
                     self.print_infos('Filename is empty')
@@ -385,32 +723,32 @@ class ItemLists():
                         f'File "{medium["filename"]}" is absent',
                         mode='error')
 
-            if mark_as_read:
-                medium['state'] = 'read'
-            medium['location'] = 'remote'
-            medium['filename'] = ''
-
-            string = f'"{medium["title"]}" '
-            if unlink:
-                string += 'removed, '
-            if mark_as_read:
-                string += 'marked as read, '
-            string += 'marked as remote.'
-            self.print_infos(string)
-
-            updated_media.append(medium)
-            original_media.append(original_medium)
+        fields = {'location': 'remote', 'filename': '', 'size': 0,
+                  'mtime': 0, 'downloaded': 0}
+        if mark_as_read:
+            fields['state'] = 'read'
 
         try:
-            self.update_media_data(original_media, updated_media)
+            self.set_media_fields(media, fields)
             self.print_infos('Database updated')
         except DataBaseUpdateException:
             self.print_infos('Cannot update database with updated media',
                              mode='error')
             return []
 
-        run_all(self.get_callbacks(self.media), ('modified', updated_media))
-        return updated_media
+        if len(media) == 1:
+            string = f'"{media[0]["title"]}" '
+        else:
+            string = f'{len(media)} media '
+        if unlink:
+            string += 'removed, '
+        if mark_as_read:
+            string += 'marked as read, '
+        string += 'marked as remote.'
+        self.print_infos(string)
+
+        run_all(self.get_callbacks(self.media), ('modified', media))
+        return media
 
     # Can raise DataBaseUpdateException
     def update_media_data(self, original_media, updated_media, update_db=True):
@@ -743,8 +1081,8 @@ class ItemLists():
 
         need_to_wait = False
 
-        media_cb = self.get_callbacks(self.media)
         channel_cb = self.get_callbacks(self.channels)
+        auto_rules = AutoRules()
 
         while True:
             try:
@@ -787,16 +1125,10 @@ class ItemLists():
             updated_channels.append(channel)
 
             # Automatic download
-            if not '' == channel['auto']:
-                regex = re.compile(channel['auto'])
-                sub_media = [medium for medium in new_media
-                             if regex.match(medium['title'])]
-                if sub_media:
-                    self.download_manager_init()
-                    for s in sub_media:
-                        self.download_manager.add(s)
-                        need_to_wait = True
-                    run_all(media_cb, ('modified', sub_media))
+            sub_media = self.download_auto(
+                channel, auto_rules.select(channel, new_media))
+            if sub_media:
+                need_to_wait = True
 
             new_media.sort(key=operator.itemgetter('date'), reverse=False)
             self.add_media(new_media)
@@ -843,31 +1175,24 @@ class ItemLists():
         return '\n'.join(exports)
 
     def medium_get_tags(self):
-        tags = Counter()
-        for medium in self.media:
-            for tag in medium['tags']:
-                tags[tag] += 1
-        return tags
+        return self.get_media_index().tag_counts()
 
     def medium_set_tags(self, media, add_tags,
                         remove_tags):
-        updated_media = []
-        original_media = []
-        for original_medium in media:
-            medium = original_medium.copy()
-            updated_media.append(medium)
-            original_media.append(original_medium)
-
-            add_tag_str = ', '.join(list(add_tags))
-            remove_tag_str = ', '.join(list(remove_tags))
+        add_tag_str = ', '.join(list(add_tags))
+        remove_tag_str = ', '.join(list(remove_tags))
 
-            medium['tags'] = set(medium['tags'])
-            medium['tags'] -= remove_tags
-            medium['tags'] |= add_tags
-            medium['tags'] = list(medium['tags'])
+        # Media ending with the same tags are updated together
+        media_by_tags = {}
+        for medium in media:
+            tags = (set(medium['tags'])-remove_tags) | add_tags
+            media_by_tags.setdefault(tuple(sorted(tags)), []).append(medium)
 
         try:
-            self.update_media_data(original_media, updated_media)
+            for tags, tag_media in media_by_tags.items():
+                self.db.update_media_fields(tag_media, {'tags': tags})
+                for medium in tag_media:
+                    medium['tags'] = list(tags)
         except DataBaseUpdateException:
             self.print_infos('Cannot update database with updated media',
                              mode='error')
@@ -876,5 +1201,5 @@ class ItemLists():
         self.print_infos(f'tags: add "{add_tag_str}" '
                          f'remove "{remove_tag_str}"')
 
-        run_all(self.get_callbacks(self.media), ('modified', updated_media))
-        return updated_media
+        run_all(self.get_callbacks(self.media), ('modified', media))
+        return media
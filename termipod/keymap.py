@@ -46,6 +46,26 @@ def get_key(screen):
     return key, key_name, mouse
 
 
+def get_pending_key(screen):
+    """ Key already typed, without waiting (None if there is none) """
+    screen.nodelay(True)
+    key = screen.getch()
+    screen.nodelay(False)
+    if key == -1:
+        return None
+
+    curses.ungetch(key)
+    return get_key(screen)
+
+
+def unget_key(key_info):
+    key, _, mouse = key_info
+    if mouse is None:
+        curses.ungetch(key)
+    else:
+        curses.ungetmouse(*mouse)
+
+
 def get_last_key():
     return lastkey
 
@@ -289,4 +309,5 @@ descriptions = {
         'channel_mask': 'Edit channel mask',
         'channel_force_update': ('Update channels '
                                  '(check also for old elements)'),
+        'channel_read': 'Mark all unread media of channels as read',
 }
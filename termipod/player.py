@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import os
+import time
 import atexit
 
 import mpv
@@ -102,6 +103,7 @@ class Player():
         medium = self.playlist[self.current_filename]
         cb = self.callbacks[self.current_filename]
         medium['state'] = 'read'
+        medium['played'] = int(time.time())
         self.print_infos('Mark as read %s' % medium['title'])
 
         if unlink and medium['filename']:
@@ -114,6 +116,10 @@ class Player():
 
         run_all(cb, ('modified', [medium]))
 
+    def get_current(self):
+        """ Medium being played, or None """
+        return self.playlist.get(self.current_filename)
+
     def play(self, medium, cb=noop, now=True):
         if now:
             self.print_infos('Play '+medium['title'])
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Duration of media files from their headers, without spawning ffprobe
+for common formats """
+import os
+import shlex
+import struct
+import subprocess
+
+
+# MP3 bitrates in kbps by (version is MPEG1, layer), and sample rates
+mp3_bitrates = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384,
+                416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256,
+                320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256,
+                320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192,
+                 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144,
+                 160),
+}
+mp3_bitrates[(False, 3)] = mp3_bitrates[(False, 2)]
+mp3_sample_rates = (44100, 48000, 32000)
+# Number of frames read to decide if bitrate is constant
+mp3_check_frames = 64
+
+
+def parse_mp3_header(header):
+    """ (frame length, samples, sample rate, bitrate, version, mono) of a 4
+    bytes MP3 frame header or None if invalid """
+    b1, b2, b3, b4 = header
+    if b1 != 0xff or b2 & 0xe0 != 0xe0:
+        return None
+    version = (b2 >> 3) & 3  # 0: MPEG2.5, 2: MPEG2, 3: MPEG1
+    layer = 4 - ((b2 >> 1) & 3)
+    bitrate_index = b3 >> 4
+    rate_index = (b3 >> 2) & 3
+    if (version == 1 or layer == 4 or bitrate_index in (0, 15)
+            or rate_index == 3):
+        return None
+
+    mpeg1 = version == 3
+    bitrate = mp3_bitrates[(mpeg1, layer)][bitrate_index]*1000
+    rate = mp3_sample_rates[rate_index] >> (3-version if version else 2)
+    padding = (b3 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12*bitrate//rate + padding)*4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples//8*bitrate//rate + padding
+    return length, samples, rate, bitrate, mpeg1, (b4 >> 6) == 3
+
+
+def get_mp3_duration(f, size):
+    # Skip ID3v2 tags
+    start = 0
+    header = f.read(10)
+    while header[:3] == b'ID3' and len(header) == 10:
+        tag_size = 0
+        for b in header[6:10]:
+            tag_size = (tag_size << 7) | (b & 0x7f)
+        start += 10 + tag_size + (10 if header[5] & 0x10 else 0)
+        f.seek(start)
+        header = f.read(10)
+    end = size
+    if size >= 128:
+        f.seek(size-128)
+        if f.read(3) == b'TAG':
+            end -= 128
+
+    # Find first frame
+    f.seek(start)
+    data = f.read(1 << 16)
+    position = data.find(b'\xff')
+    frame = None
+    while position != -1 and position+4 <= len(data):
+        frame = parse_mp3_header(data[position:position+4])
+        if frame is not None:
+            break
+        position = data.find(b'\xff', position+1)
+    if frame is None:
+        return None
+    start += position
+    length, samples, rate, bitrate, mpeg1, mono = frame
+
+    # Xing/Info or VBRI header gives number of frames
+    f.seek(start)
+    data = f.read(max(length, 64))
+    xing = 4 + (17 if mono else 32) if mpeg1 else 4 + (9 if mono else 17)
+    if data[xing:xing+4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing+4:xing+8])[0]
+        if flags & 1:
+            frames = struct.unpack('>I', data[xing+8:xing+12])[0]
+            return frames*samples/rate
+    elif data[36:40] == b'VBRI':
+        frames = struct.unpack('>I', data[50:54])[0]
+        return frames*samples/rate
+
+    # Constant bitrate if first frames agree, else scan all frames
+    duration = 0
+    position = start
+    bitrates = set()
+    nframes = 0
+    while position+4 <= end:
+        f.seek(position)
+        frame = parse_mp3_header(f.read(4))
+        if frame is None:
+            break
+        length, samples, rate, bitrate = frame[:4]
+        duration += samples/rate
+        bitrates.add(bitrate)
+        nframes += 1
+        if nframes == mp3_check_frames and len(bitrates) == 1:
+            return (end-start)*8/bitrate
+        position += length
+    return duration
+
+
+def get_mp4_duration(f, size):
+    def boxes(start, end):
+        """ (type, data start, end) of boxes between start and end """
+        position = start
+        while position+8 <= end:
+            f.seek(position)
+            box_size, box_type = struct.unpack('>I4s', f.read(8))
+            header = 8
+            if box_size == 1:
+                box_size = struct.unpack('>Q', f.read(8))[0]
+                header = 16
+            elif box_size == 0:
+                box_size = end-position
+            if box_size < header:
+                return
+            yield box_type, position+header, position+box_size
+            position += box_size
+
+    for box_type, start, end in boxes(0, size):
+        if box_type != b'moov':
+            continue
+        for box_type, start, end in boxes(start, end):
+            if box_type != b'mvhd':
+                continue
+            f.seek(start)
+            data = f.read(32)
+            if data[0] == 1:
+                timescale, duration = struct.unpack('>IQ', data[20:32])
+            else:
+                timescale, duration = struct.unpack('>II', data[12:20])
+            return duration/timescale if timescale else None
+    return None
+
+
+def get_ogg_duration(f, size):
+    # Sample rate from identification header in first page
+    page = f.read(1 << 12)
+    if page[:4] != b'OggS':
+        return None
+    packet = page[27+page[26]:]
+    pre_skip = 0
+    if packet[:7] == b'\x01vorbis':
+        rate = struct.unpack('<I', packet[12:16])[0]
+    elif packet[:8] == b'OpusHead':
+        rate = 48000
+        pre_skip = struct.unpack('<H', packet[10:12])[0]
+    elif packet[:5] == b'\x7fFLAC':
+        rate = struct.unpack('>I', packet[27:31])[0] >> 12
+    else:
+        return None
+
+    # Granule position of last page is the number of samples
+    chunk = 1 << 16
+    while True:
+        start = max(0, size-chunk)
+        f.seek(start)
+        data = f.read(chunk)
+        position = data.rfind(b'OggS')
+        # Skip capture patterns found in page data
+        while position != -1 and (position+14 > len(data)
+                                  or data[position+4] != 0):
+            position = data.rfind(b'OggS', 0, position)
+        if position != -1:
+            granule = struct.unpack('<q', data[position+6:position+14])[0]
+            return (granule-pre_skip)/rate if rate else None
+        if not start:
+            return None
+        chunk *= 4
+
+
+# Matroska element ids
+ebml_segment = 0x18538067
+ebml_info = 0x1549a966
+ebml_cluster = 0x1f43b675
+ebml_timecode_scale = 0x2ad7b1
+ebml_duration = 0x4489
+
+
+def read_vint(f, keep_marker):
+    """ Variable size integer (None at end of file or if unknown) """
+    first = f.read(1)
+    if not first:
+        return None
+    first = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        return None
+    value = first if keep_marker else first & (mask-1)
+    for b in f.read(length-1):
+        value = (value << 8) | b
+    if not keep_marker and value == (1 << (7*length))-1:
+        return -1  # Unknown size
+    return value
+
+
+def get_webm_duration(f, size):
+    end = size
+    position = 0
+    while position < end:
+        f.seek(position)
+        element = read_vint(f, True)
+        element_size = read_vint(f, False)
+        if element is None or element_size is None:
+            return None
+        start = f.tell()
+        if element_size == -1:
+            element_size = end-start
+
+        if element == ebml_segment:
+            # Look into its children
+            position = start
+            end = start+element_size
+            continue
+        elif element == ebml_cluster:
+            return None
+        elif element == ebml_info:
+            scale = 1000000
+            duration = None
+            child = start
+            while child < start+element_size:
+                f.seek(child)
+                child_id = read_vint(f, True)
+                child_size = read_vint(f, False)
+                if child_id is None or child_size is None:
+                    break
+                data = f.read(child_size)
+                if child_id == ebml_timecode_scale:
+                    scale = int.from_bytes(data, 'big')
+                elif child_id == ebml_duration:
+                    duration = struct.unpack(
+                        '>f' if child_size == 4 else '>d', data)[0]
+                child = f.tell()
+            return duration*scale/1e9 if duration is not None else None
+        position = start+element_size
+    return None
+
+
+def get_format(header):
+    if header[4:8] == b'ftyp':
+        return get_mp4_duration
+    elif header[:4] == b'OggS':
+        return get_ogg_duration
+    elif header[:4] == b'\x1a\x45\xdf\xa3':
+        return get_webm_duration
+    elif header[:3] == b'ID3' or parse_mp3_header(header[:4]) is not None:
+        return get_mp3_duration
+    return None
+
+
+def get_duration_ffprobe(filename):
+    filename = os.path.abspath(filename).replace('"', '\\"')
+    commandline = ('ffprobe -i "%s" -show_entries '
+                   'format=duration -v quiet -of csv="p=0"' % filename)
+    args = shlex.split(commandline)
+    try:
+        result = subprocess.Popen(
+                args,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError:  # ffprobe is not installed
+        return 0
+    output = result.communicate()
+    try:
+        return int(float(output[0]))
+    except ValueError:
+        return 0
+
+
+def get_duration(filename):
+    """ Duration in seconds (0 if unknown) from file headers, or ffprobe
+    for other formats """
+    try:
+        with open(filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            probe = get_format(f.read(12))
+            if probe is not None:
+                f.seek(0)
+                duration = probe(f, size)
+                if duration is not None and duration > 0:
+                    return int(duration)
+    except (OSError, struct.error, IndexError, ValueError):
+        pass
+    return get_duration_ffprobe(filename)
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Retention of downloaded media: removal rules, disk budgets and
+admission of automatic downloads """
+import os
+import time
+from collections import defaultdict, Counter
+from threading import Lock, Timer
+
+import termipod.config as Config
+from termipod.utils import format_size, commastr_to_list
+
+
+def parse_channel_sizes(string):
+    """ Sizes by channel title from "title=size, title=size" (invalid
+    entries are ignored) """
+    sizes = {}
+    for entry in commastr_to_list(string):
+        title, _, size = entry.rpartition('=')
+        try:
+            sizes[title.strip()] = int(size)
+        except ValueError:
+            pass
+    return sizes
+
+
+def get_download_time(medium):
+    """ Time medium was downloaded (file modification time if downloaded
+    before it was recorded) """
+    return medium['downloaded'] or medium['mtime']
+
+
+def get_file_id(medium):
+    """ (device, inode) of file of medium and its number of links, None
+    and 1 if it cannot be read """
+    try:
+        stat = os.stat(medium['filename'])
+    except OSError:
+        return None, 1
+    return (stat.st_dev, stat.st_ino), stat.st_nlink
+
+
+def get_freed_size(media):
+    """ Disk space freed by removing files of media (a file linked by
+    deduplication is freed with its last link) """
+    removed_links = Counter()
+    files = {}
+    for medium in media:
+        file_id, nlink = get_file_id(medium)
+        if file_id is None:
+            continue
+        removed_links[file_id] += 1
+        files[file_id] = (medium['size'], nlink)
+    return sum(size for file_id, (size, nlink) in files.items()
+               if removed_links[file_id] >= nlink)
+
+
+def eviction_key(medium):
+    """ Local media first, played ones then unread ones, first downloaded
+    first """
+    if medium['location'] != 'local':
+        return (2, 0)
+    return (0 if medium['state'] != 'unread' else 1,
+            get_download_time(medium) or medium['date'])
+
+
+class Retention:
+    # Delay in seconds to group changes before rules are applied
+    delay = 2
+
+    def __init__(self, item_lists):
+        self.item_lists = item_lists
+        # Index of local files by eviction priority
+        self.ordering = item_lists.get_ordering(
+            item_lists.media, 'retention', eviction_key)
+        self.mutex = Lock()
+        self.run_mutex = Lock()
+        self.timer = None
+        # Automatic downloads waiting for space, and estimated size of
+        # admitted ones until they are local
+        self.deferred = []
+        self.admitted = {}
+        # Media downloaded on user request, never removed to free space
+        self.requested = set()
+
+        item_lists.media.callbacks.append(self.media_changed)
+
+    def enabled(self):
+        return bool(Config.get('retention.max_size')
+                    or Config.get('retention.channel_max_size')
+                    or Config.get('retention.channel_sizes')
+                    or Config.get('retention.max_days')
+                    or Config.get('retention.delete_played'))
+
+    def request(self, medium):
+        """ Medium downloaded on user request """
+        self.requested.add((medium['link'], medium['cid']))
+
+    def media_changed(self, state, items):
+        for medium in items:
+            if state == 'removed' or medium.get('location') == 'remote':
+                self.requested.discard((medium['link'], medium['cid']))
+        if state == 'removed' or any(m.get('location') == 'local'
+                                     for m in items):
+            self.schedule()
+
+    def schedule(self):
+        with self.mutex:
+            if self.timer is None and self.enabled():
+                self.timer = Timer(self.delay, self.run)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def get_local(self):
+        """ Local media in eviction order """
+        media = self.item_lists.media
+        return [media[i] for i in self.ordering.indices_below((2,))]
+
+    def get_channel_budget(self, channel):
+        sizes = parse_channel_sizes(Config.get('retention.channel_sizes'))
+        size = sizes.get(channel['title'],
+                         Config.get('retention.channel_max_size'))
+        return size*1024**2
+
+    def select(self, local):
+        """ Media to remove by rules (local media in eviction order), and
+        size of remaining media by channel """
+        now = time.time()
+        delete_played = Config.get('retention.delete_played')
+        max_age = Config.get('retention.max_days')*86400
+        keep_unread = Config.get('retention.keep_unread')
+
+        # Most recent unread media of each channel are never removed
+        unread = defaultdict(list)
+        for medium in local:
+            if medium['state'] == 'unread':
+                unread[medium['cid']].append(medium)
+        protected = set()
+        # Medium loaded in the player
+        player = self.item_lists.player
+        if player is not None and player.get_current() is not None:
+            protected.add(id(player.get_current()))
+        if keep_unread:
+            for media in unread.values():
+                media.sort(key=lambda m: m['date'], reverse=True)
+                protected.update(id(m) for m in media[:keep_unread])
+
+        # Not removed to free space, as requested by user or because
+        # removing a linked file frees nothing
+        files = {id(m): get_file_id(m) for m in local}
+        pinned = set(protected)
+        pinned.update(id(m) for m in local
+                      if (m['link'], m['cid']) in self.requested
+                      or files[id(m)][1] > 1)
+
+        evicted = []
+        kept = []
+        sizes = Counter()
+        counted = set()
+        for medium in local:
+            if id(medium) not in protected:
+                downloaded = get_download_time(medium)
+                age = now-(downloaded or medium['date'])
+                # Only media played since they were downloaded
+                played = (medium['state'] == 'read' and downloaded
+                          and medium['played'] >= downloaded)
+                if ((delete_played and played)
+                        or (max_age and age > max_age)):
+                    evicted.append(medium)
+                    continue
+            kept.append(medium)
+            # Files linked by several media are counted once
+            file_id = files[id(medium)][0]
+            if file_id is None or file_id not in counted:
+                counted.add(file_id)
+                sizes[medium['cid']] += medium['size']
+
+        # Channel budgets then global budget
+        remaining = []
+        for medium in kept:
+            cid = medium['cid']
+            budget = self.get_channel_budget(medium['channel'])
+            if (budget and sizes[cid] > budget
+                    and id(medium) not in pinned):
+                evicted.append(medium)
+                sizes[cid] -= medium['size']
+            else:
+                remaining.append(medium)
+
+        budget = Config.get('retention.max_size')*1024**2
+        total = sum(sizes.values())
+        for medium in remaining:
+            if not budget or total <= budget:
+                break
+            if id(medium) not in pinned:
+                evicted.append(medium)
+                sizes[medium['cid']] -= medium['size']
+                total -= medium['size']
+
+        return evicted, sizes
+
+    def run(self):
+        """ Remove media selected by rules, and download deferred media if
+        there is now space for them """
+        with self.mutex:
+            self.timer = None
+        if not self.enabled():
+            return
+
+        with self.run_mutex:
+            evicted, _ = self.select(self.get_local())
+            if evicted:
+                size = get_freed_size(evicted)
+                self.item_lists.remove_media(evicted, mark_as_read=False)
+                self.item_lists.print_infos(
+                    f'Retention: {len(evicted)} media removed '
+                    f'({format_size(size)} freed)')
+
+            with self.mutex:
+                self.admitted = {k: v for k, v in self.admitted.items()
+                                 if v[0]['location'] == 'download'}
+                deferred = self.deferred
+                self.deferred = []
+
+            deferred = [m for m in deferred if m['location'] == 'remote']
+            by_channel = defaultdict(list)
+            for medium in deferred:
+                by_channel[medium['cid']].append(medium)
+            for media in by_channel.values():
+                self.item_lists.download_auto(media[0]['channel'], media)
+
+    def admit(self, channel, media):
+        """ Automatic downloads of channel fitting in budgets (once media
+        removable by rules are removed), others are deferred """
+        budget = Config.get('retention.max_size')*1024**2
+        channel_budget = self.get_channel_budget(channel)
+        if not media or not (budget or channel_budget):
+            return media
+
+        local = self.get_local()
+        _, sizes = self.select(local)
+        with self.mutex:
+            for medium, size in self.admitted.values():
+                sizes[medium['cid']] += size
+        total = sum(sizes.values())
+
+        # Size of new media estimated from local media
+        local_sizes = ([m['size'] for m in local if m['cid'] == channel['id']]
+                       or [m['size'] for m in local])
+        estimate = (sum(local_sizes)//len(local_sizes) if local_sizes
+                    else 0)
+
+        cid = channel['id']
+        admitted = []
+        deferred = []
+        for medium in media:
+            if ((budget and total+estimate > budget)
+                    or (channel_budget
+                        and sizes[cid]+estimate > channel_budget)):
+                deferred.append(medium)
+            else:
+                admitted.append(medium)
+                total += estimate
+                sizes[cid] += estimate
+
+        with self.mutex:
+            for medium in admitted:
+                self.admitted[id(medium)] = (medium, estimate)
+            self.deferred.extend(deferred)
+        if deferred:
+            self.item_lists.print_infos(
+                f'{len(deferred)} automatic download(s) of '
+                f'{channel["title"]} deferred (disk budget)')
+        return admitted
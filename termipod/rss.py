@@ -16,12 +16,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from time import mktime
-import urllib.request
 
 import feedparser as fp
 
 from termipod.utils import printable_str
 from termipod.backends_exceptions import DownloadError
+import termipod.httpdownload as httpdownload
+import termipod.bandwidth as bandwidth
 
 
 def get_all_data(url, opts, print_infos):
@@ -35,8 +36,8 @@ def get_new_data(channel, opts, print_infos):
 
 def get_data(url, print_infos):
     # to avoid using request_headers in fp.parse
-    # we use urlopen
-    rawpage = urllib.request.urlopen(url).read()
+    # we download page first (within bandwidth limits)
+    rawpage = bandwidth.read_url(url, 'feed')
     rss = fp.parse(rawpage)
 
     feed = rss.feed
@@ -87,12 +88,12 @@ def get_data(url, print_infos):
     return data
 
 
-def download(url, filename, print_infos):
+def download(url, filename, print_infos, progress):
     try:
-        urllib.request.urlretrieve(url, filename)
-    except urllib.error.URLError:
-        print_infos('Cannot access to %s' % url)
-        raise DownloadError
+        return httpdownload.download(url, filename, progress)
+    except DownloadError as e:
+        print_infos(str(e))
+        raise
 
 
 def get_filename_extension(medium):
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import re
+from functools import lru_cache
+
+import termipod.config as Config
+from termipod.utils import commastr_to_list
+
+
+@lru_cache(maxsize=4096)
+def compile_pattern(pattern):
+    """ Compiled regex for auto/mask patterns, cached by pattern string so
+    that changing channel settings naturally uses a new entry """
+    return re.compile(pattern)
+
+
+def filter_by_pattern(media, pattern):
+    match = compile_pattern(pattern).match
+    return [medium for medium in media if match(medium['title'])]
+
+
+class AutoRules:
+    """ Rules selecting new media to download automatically
+
+    Channel 'auto' pattern is applied first, then global rules (read once at
+    creation) are evaluated on all remaining media """
+    def __init__(self):
+        self.min_duration = Config.get('Global.auto_min_minutes')*60
+        self.max_duration = Config.get('Global.auto_max_minutes')*60
+        self.skip_categories = set(
+            commastr_to_list(Config.get('Global.auto_skip_categories')))
+        skip_pattern = Config.get('Global.auto_skip_pattern')
+        self.skip_match = (compile_pattern(skip_pattern).search
+                           if skip_pattern else None)
+
+        self.rules = []
+        # Unknown durations (0) are not filtered
+        if self.min_duration:
+            self.rules.append(
+                lambda m: not m['duration']
+                or self.min_duration <= m['duration'])
+        if self.max_duration:
+            self.rules.append(
+                lambda m: not m['duration']
+                or m['duration'] <= self.max_duration)
+        if self.skip_match is not None:
+            self.rules.append(lambda m: not self.skip_match(m['title']))
+
+    def channel_allowed(self, channel):
+        return (channel['auto'] != ''
+                and not self.skip_categories & set(channel['categories']))
+
+    def select(self, channel, media):
+        if not media or not self.channel_allowed(channel):
+            return []
+
+        media = filter_by_pattern(media, channel['auto'])
+        for rule in self.rules:
+            media = [medium for medium in media if rule(medium)]
+        return media
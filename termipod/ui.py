@@ -22,12 +22,11 @@ import tempfile
 import re
 import time
 import shlex
-from bisect import bisect
-from threading import Lock, Thread
+from threading import Lock, Thread, Timer, Condition, get_ident
 from sys import stderr
-from queue import Queue
-from time import sleep
 from datetime import datetime
+from functools import lru_cache
+from bisect import bisect_left, bisect_right
 from collections import deque, OrderedDict
 import subprocess
 import imghdr
@@ -41,22 +40,36 @@ except ModuleNotFoundError:
     _has_pyperclip = False
 
 from termipod.utils import (duration_to_str, ts_to_date, print_log,
-                            format_string, printable_str, noop,
+                            format_string, wrap_string, printable_str, noop,
                             commastr_to_list, list_to_commastr,
-                            options_string_to_dict, screen_reset)
-from termipod.itemlist import ItemLists, ItemListException
+                            options_string_to_dict, screen_reset,
+                            MessageHistory, format_size)
+from termipod.itemlist import (ItemLists, ItemListException,
+                               bitset_to_indices)
+from termipod.indexedlist import IndexedList
 from termipod.keymap import (Keymap, get_key, get_key_name, get_key_code,
-                             get_last_key, init_key_tables, get_keymap)
+                             get_last_key, init_key_tables, get_keymap,
+                             get_pending_key, unget_key)
 from termipod.httpserver import HTTPServer
 from termipod.completer import (CommaListSizeCompleter, CommandCompleter)
 import termipod.image as termimage
 from termipod.cache import item_get_cache
 import termipod.colors as Colors
 import termipod.config as Config
+import termipod.bandwidth as bandwidth
 import termipod.playlist as Playlist
 import termipod.fuse as Termifuse
 
 
+# Moves whose repeated keys are handled at once
+merged_moves = {
+    'line_down': ('line', 'down'),
+    'line_up': ('line', 'up'),
+    'page_down': ('page', 'down'),
+    'page_up': ('page', 'up'),
+}
+
+
 def init():
     global screen, info_area, tabs, screen_size
     screen = curses.initscr()
@@ -87,6 +100,13 @@ def loop():
             # Check frequently in case update_minutes changes
             time.sleep(30)
 
+    def download_progress_task():
+        while True:
+            time.sleep(1/InfoArea.progress_rate)
+            if item_lists.download_manager is not None:
+                info_area.show_progress(
+                    item_lists.download_manager.get_progress())
+
     init_key_tables(screen)
 
     try:
@@ -123,13 +143,18 @@ def loop():
             exit(-1)
 
     # Run download manager
-    item_lists.download_manager_init(dl_marked=False)
+    item_lists.download_manager_init(dl_marked=True)
 
     # Run update thread
     thread = Thread(target=update_channels_task)
     thread.daemon = True
     thread.start()
 
+    # Show download progress
+    thread = Thread(target=download_progress_task)
+    thread.daemon = True
+    thread.start()
+
     # Init player
     item_lists.player_init()
 
@@ -172,14 +197,25 @@ def loop():
         # All tab commands
         ###################################################################
 
-        elif 'line_down' == action:
-            tabs.move_screen('line', 'down')
-        elif 'line_up' == action:
-            tabs.move_screen('line', 'up')
-        elif 'page_down' == action:
-            tabs.move_screen('page', 'down')
-        elif 'page_up' == action:
-            tabs.move_screen('page', 'up')
+        elif action in merged_moves:
+            what, way = merged_moves[action]
+            number = 1
+            # Merge moves typed in the meantime to draw only once
+            while True:
+                key_info = get_pending_key(screen)
+                if key_info is None:
+                    break
+                next_action = keymap.get_action(area_key_class, key_info[1])
+                if (next_action not in merged_moves
+                        or merged_moves[next_action][0] != what):
+                    unget_key(key_info)
+                    break
+                number += 1 if merged_moves[next_action][1] == way else -1
+
+            if number < 0:
+                way = 'up' if way == 'down' else 'down'
+            if number:
+                tabs.move_screen(what, way, abs(number))
         elif 'bottom' == action:
             tabs.move_screen('all', 'down')
         elif 'top' == action:
@@ -216,141 +252,7 @@ def loop():
             area.switch_thumbnail_mode()
 
         elif 'command_get' == action:
-            completer = CommandCompleter()
-
-            completer.add_command('add', 'Add a channel')
-            completer.add_option(
-                ['add'], 'url', '', '[^ ]+', 'URL', position=0)
-            completer.add_option(
-                ['add'], 'count', 'count=', 'count=[-0-9]+',
-                'Maximal number of elements to retrieve info')
-            completer.add_option(
-                ['add'], 'force', 'force', 'force',
-                'Force creation if already exists')
-            completer.add_option(
-                ['add'], 'strict', 'strict', 'strict',
-                'Do no retrieve list of files after count')
-            completer.add_option(
-                ['add'], 'auto', 'auto=', 'auto=[^ ]+',
-                'Regex for files to download automatically')
-            completer.add_option(
-                ['add'], 'categories', 'categories=', 'categories=[^ ]+',
-                'Comma separated list of categories (use quotes)')
-            completer.add_option(
-                ['add'], 'name', 'name=', 'name=[^ ]+',
-                'Alternative name of the channel (needed with force)')
-
-            completer.add_command('addvideo',
-                                  'Add a video (to a new disabled channel)')
-            completer.add_option(
-                ['addvideo'], 'url', '', '[^ ]+', 'URL', position=0)
-            completer.add_option(
-                ['addvideo'], 'force', 'force', 'force',
-                'Force creation if already exists')
-            completer.add_option(
-                ['addvideo'], 'categories', 'categories=',
-                'categories=[^ ]+',
-                'Comma separated list of categories (use quotes)')
-            completer.add_option(
-                ['addvideo'], 'name', 'name=', 'name=[^ ]+',
-                'Alternative name of the channel')
-
-            completer.add_command('open', 'Open a URL')
-            completer.add_option(
-                ['open'], 'url', '', '[^ ]+', 'URL', position=0)
-            completer.add_option(
-                ['open'], 'count', 'count=', 'count=[-0-9]+',
-                'Maximal number of elements to retrieve info')
-
-            completer.add_command('search', 'Search on youtube')
-            completer.add_option(
-                ['search'], 'search string', '', '.+', 'search string',
-                position=0)
-            completer.add_option(
-                ['search'], 'count', 'count=', 'count=[-0-9]+',
-                'Maximal number of elements to retrieve info')
-
-            completer.add_command('tab', 'Add new media tab')
-            completer.add_option(
-                ['tab'], 'shown name', '', '.+', 'shown name',
-                position=0)
-
-            completer.add_command('tabsearch',
-                                  'Search on youtube in a new tab')
-            completer.add_option(
-                ['tabsearch'], 'search string', '', '.+', 'search string',
-                position=0)
-            completer.add_option(
-                ['tabsearch'], 'count', 'count=', 'count=[-0-9]+',
-                'Maximal number of elements to retrieve info')
-
-            completer.add_command('tabopen', 'Open a URL in a new tab')
-            completer.add_option(
-                ['tabopen'], 'url', '', '[^ ]+', 'URL', position=0)
-            completer.add_option(
-                ['tabopen'], 'count', 'count=', 'count=[-0-9]+',
-                'Maximal number of elements to retrieve info')
-
-            completer.add_command('playlist',
-                                  'Open a m3u playlist')
-            completer.add_option(
-                ['playlist'], 'playlist name', '', '.+', 'playlist name',
-                position=0)
-
-            completer.add_command('channels', 'Open/Show tab with channels')
-
-            completer.add_command('tabclose', 'Close current tab')
-
-            completer.add_command('tabrename', 'Rename current tab')
-            completer.add_option(
-                ['tabrename'], 'new name', '', '.+', 'new name',
-                position=0)
-
-            completer.add_command(
-                'channelRemove',
-                'Remove selected channels (and all associated media)')
-
-            completer.add_command('channelDisable',
-                                  'Disable selected channels')
-
-            completer.add_command('channelEnable',
-                                  'Enable selected channels')
-
-            completer.add_command('help', 'Show help')
-
-            completer.add_command('messages', 'Print last messages')
-            completer.add_option(
-                ['messages'], 'file', '', '.*', 'Output file')
-
-            completer.add_command('maps', 'Show key maps')
-
-            completer.add_command('errors', 'Print last errors')
-            completer.add_option(
-                ['errors'], 'file', '', '.*', 'Output file')
-
-            completer.add_command(
-                'httpServerStart',
-                'Start http streaming server')
-            completer.add_option(
-                ['httpServerStart'], 'port', '', '[0-9]+', 'Port')
-
-            completer.add_command('httpServerStop', 'Stop the server')
-
-            completer.add_command('httpServerStatus',
-                                  'Get streaming server status')
-
-            completer.add_command('quit', 'Quit termipod')
-
-            completer.add_command(
-                'set', 'See/Change parameter (see config file for list)')
-            for param, value in Config.default_params.items():
-                if param == 'Tabs':
-                    continue
-                desc = value[1]
-                completer.add_option(
-                    ['set'], param, param+' ', param, desc, position=0)
-            completer.add_option(
-                ['set'], 'value', '', '.+', 'value', position=1)
+            completer = get_command_completer()
 
             # TODO generate help for show_command_help from completer
             string = run_command(':', completer=completer)
@@ -591,12 +493,19 @@ def loop():
                     area.show_command_help('set', error=True)
                 else:
                     param = command[1]
-                    if len(command) == 2:
-                        value = Config.get(param)
-                        print_infos(f'{param}: {value}')
-                    else:
-                        value = command[2]
-                        Config.set(param, value)
+                    try:
+                        if len(command) == 2:
+                            value = Config.get(param)
+                            print_infos(f'{param}: {value}')
+                        else:
+                            value = command[2]
+                            Config.set(param, value)
+                            # Limits shared with download processes
+                            if param in bandwidth.config_params:
+                                bandwidth.update_config()
+                    except (ValueError, KeyError, TypeError) as e:
+                        print_infos(f'Cannot set {param}: {e}',
+                                    mode='error')
 
             else:
                 print_infos('Command "%s" not found' % command[0],
@@ -936,6 +845,10 @@ def loop():
             channels = tabs.get_user_selection(idx)
             item_lists.update_channels(channels, force_all=True)
 
+        elif 'channel_read' == action:
+            channels = tabs.get_user_selection(idx)
+            item_lists.channel_set_media_state(channels, 'read', 'unread')
+
         # Action not recognized
         else:
             print_infos(f'Unknown action "{action}"', mode='error')
@@ -947,6 +860,154 @@ def save_and_clean():
     Config.save_tabs(tabs.get_config())
 
 
+def get_command_completer():
+    """ Completer of commands, built once """
+    if get_command_completer.completer is not None:
+        return get_command_completer.completer
+
+    completer = CommandCompleter()
+
+    completer.add_command('add', 'Add a channel')
+    completer.add_option(
+        ['add'], 'url', '', '[^ ]+', 'URL', position=0)
+    completer.add_option(
+        ['add'], 'count', 'count=', 'count=[-0-9]+',
+        'Maximal number of elements to retrieve info')
+    completer.add_option(
+        ['add'], 'force', 'force', 'force',
+        'Force creation if already exists')
+    completer.add_option(
+        ['add'], 'strict', 'strict', 'strict',
+        'Do no retrieve list of files after count')
+    completer.add_option(
+        ['add'], 'auto', 'auto=', 'auto=[^ ]+',
+        'Regex for files to download automatically')
+    completer.add_option(
+        ['add'], 'categories', 'categories=', 'categories=[^ ]+',
+        'Comma separated list of categories (use quotes)')
+    completer.add_option(
+        ['add'], 'name', 'name=', 'name=[^ ]+',
+        'Alternative name of the channel (needed with force)')
+
+    completer.add_command('addvideo',
+                          'Add a video (to a new disabled channel)')
+    completer.add_option(
+        ['addvideo'], 'url', '', '[^ ]+', 'URL', position=0)
+    completer.add_option(
+        ['addvideo'], 'force', 'force', 'force',
+        'Force creation if already exists')
+    completer.add_option(
+        ['addvideo'], 'categories', 'categories=',
+        'categories=[^ ]+',
+        'Comma separated list of categories (use quotes)')
+    completer.add_option(
+        ['addvideo'], 'name', 'name=', 'name=[^ ]+',
+        'Alternative name of the channel')
+
+    completer.add_command('open', 'Open a URL')
+    completer.add_option(
+        ['open'], 'url', '', '[^ ]+', 'URL', position=0)
+    completer.add_option(
+        ['open'], 'count', 'count=', 'count=[-0-9]+',
+        'Maximal number of elements to retrieve info')
+
+    completer.add_command('search', 'Search on youtube')
+    completer.add_option(
+        ['search'], 'search string', '', '.+', 'search string',
+        position=0)
+    completer.add_option(
+        ['search'], 'count', 'count=', 'count=[-0-9]+',
+        'Maximal number of elements to retrieve info')
+
+    completer.add_command('tab', 'Add new media tab')
+    completer.add_option(
+        ['tab'], 'shown name', '', '.+', 'shown name',
+        position=0)
+
+    completer.add_command('tabsearch',
+                          'Search on youtube in a new tab')
+    completer.add_option(
+        ['tabsearch'], 'search string', '', '.+', 'search string',
+        position=0)
+    completer.add_option(
+        ['tabsearch'], 'count', 'count=', 'count=[-0-9]+',
+        'Maximal number of elements to retrieve info')
+
+    completer.add_command('tabopen', 'Open a URL in a new tab')
+    completer.add_option(
+        ['tabopen'], 'url', '', '[^ ]+', 'URL', position=0)
+    completer.add_option(
+        ['tabopen'], 'count', 'count=', 'count=[-0-9]+',
+        'Maximal number of elements to retrieve info')
+
+    completer.add_command('playlist',
+                          'Open a m3u playlist')
+    completer.add_option(
+        ['playlist'], 'playlist name', '', '.+', 'playlist name',
+        position=0)
+
+    completer.add_command('channels', 'Open/Show tab with channels')
+
+    completer.add_command('tabclose', 'Close current tab')
+
+    completer.add_command('tabrename', 'Rename current tab')
+    completer.add_option(
+        ['tabrename'], 'new name', '', '.+', 'new name',
+        position=0)
+
+    completer.add_command(
+        'channelRemove',
+        'Remove selected channels (and all associated media)')
+
+    completer.add_command('channelDisable',
+                          'Disable selected channels')
+
+    completer.add_command('channelEnable',
+                          'Enable selected channels')
+
+    completer.add_command('help', 'Show help')
+
+    completer.add_command('messages', 'Print last messages')
+    completer.add_option(
+        ['messages'], 'file', '', '.*', 'Output file')
+
+    completer.add_command('maps', 'Show key maps')
+
+    completer.add_command('errors', 'Print last errors')
+    completer.add_option(
+        ['errors'], 'file', '', '.*', 'Output file')
+
+    completer.add_command(
+        'httpServerStart',
+        'Start http streaming server')
+    completer.add_option(
+        ['httpServerStart'], 'port', '', '[0-9]+', 'Port')
+
+    completer.add_command('httpServerStop', 'Stop the server')
+
+    completer.add_command('httpServerStatus',
+                          'Get streaming server status')
+
+    completer.add_command('quit', 'Quit termipod')
+
+    completer.add_command(
+        'set', 'See/Change parameter (see config file for list)')
+    for param, value in Config.default_params.items():
+        if param == 'Tabs':
+            continue
+        desc = value[1]
+        completer.add_option(
+            ['set'], param, param+' ', param, desc, position=0)
+    completer.add_option(
+        ['set'], 'value', '', '.+', 'value', position=1)
+
+    get_command_completer.completer = completer
+    return completer
+
+
+get_command_completer.completer = None
+
+
 def print_infos(*args, **kwargs):
     info_area.print(*args, **kwargs)
 
@@ -992,9 +1053,10 @@ def resize():
 
 
 def print_terminal(message, mutex=None, pager=True):
+    """ message: string or iterable of lines (read only once) """
     global screen
-    if not isinstance(message, str):
-        message = '\n'.join(message)
+    if isinstance(message, str):
+        message = message.split('\n')
 
     if mutex is not None:
         mutex.acquire()
@@ -1004,19 +1066,24 @@ def print_terminal(message, mutex=None, pager=True):
     if pager:
         pager_bin = os.environ.get('PAGER', 'less')
 
-        # We need to add blank lines to prevent pager to quit directly
-        if pager_bin == 'more':
-            screenlines, _ = screen_size
-            nlines = message.count('\n')
-            if nlines < screenlines:
-                message += '\n'*(screenlines-nlines)
+        with tempfile.NamedTemporaryFile('w') as f:
+            nlines = 0
+            for line in message:
+                f.write(line+'\n')
+                nlines += 1
 
-        with tempfile.NamedTemporaryFile(buffering=0) as f:
-            f.write(message.encode())
+            # We need to add blank lines to prevent pager to quit directly
+            if pager_bin == 'more':
+                screenlines, _ = screen_size
+                if nlines < screenlines:
+                    f.write('\n'*(screenlines-nlines))
+
+            f.flush()
             subprocess.call([f'{pager_bin} {f.name}'], shell=True)
 
     else:
-        print(message)
+        for line in message:
+            print(line)
         input("-- Press Enter to continue --")
     screen = curses.initscr()
     refresh(mutex=False)
@@ -1024,6 +1091,16 @@ def print_terminal(message, mutex=None, pager=True):
         mutex.release()
 
 
+def wrap_lines(lines, width, max_lines):
+    """ First max_lines lines of wrapped lines """
+    flines = []
+    for line in lines:
+        flines.extend(wrap_string(line, width))
+        if len(flines) >= max_lines:
+            break
+    return flines[:max_lines]
+
+
 def print_popup(lines, position=None, margin=8, sticky=False, fit=False,
                 close_on_repeat=True, search=''):
     max_height, max_width = screen.getmaxyx()
@@ -1036,9 +1113,10 @@ def print_popup(lines, position=None, margin=8, sticky=False, fit=False,
     width = max_width-outer_margin*2
     text_width = width-inner_margin*2
 
-    flines = []
-    for line in lines:
-        flines.extend(format_string(line, text_width, truncate=False))
+    # Lines after the visible ones (and the one telling they are
+    # truncated) are not wrapped
+    max_lines = max_height-1
+    flines = wrap_lines(lines, text_width, max_lines)
 
     height = len(flines)+2  # for border
     if fit:
@@ -1047,9 +1125,7 @@ def print_popup(lines, position=None, margin=8, sticky=False, fit=False,
         if fit_size < width:
             width = fit_size
             text_width = max_text_width
-            flines = []
-            for line in lines:
-                flines.extend(format_string(line, text_width, truncate=False))
+            flines = wrap_lines(lines, text_width, max_lines)
 
     # Compute first line position
     if height > max_height:
@@ -1086,8 +1162,8 @@ def print_popup(lines, position=None, margin=8, sticky=False, fit=False,
 
             else:
                 # Split with highlight string and put it back
-                parts = re.split('('+print_popup.popup_search+')', line,
-                                 flags=re.IGNORECASE)
+                parts = compile_highlight(print_popup.popup_search).split(
+                    line)
                 written = inner_margin
                 style_idx = 0
                 for part in parts:
@@ -1380,13 +1456,117 @@ class Tabs:
             return False
 
 
+class LineCache:
+    """ Lines of an area, formatted only when accessed
+
+    Sequence view on area selection: only shown lines are formatted, and a
+    few are kept in a LRU cache (by item index) """
+    maxsize = 1024
+
+    def __init__(self, area):
+        self.area = area
+        self.lines = OrderedDict()
+
+    def __len__(self):
+        return len(self.area.selection)
+
+    def __getitem__(self, position):
+        idx = self.area.selection[position]
+        try:
+            line = self.lines[idx]
+        except KeyError:
+            line = self.area.item_to_string(self.area.itemlist[idx])
+            self.lines[idx] = line
+            if len(self.lines) > self.maxsize:
+                self.lines.popitem(last=False)
+        else:
+            self.lines.move_to_end(idx)
+        return line
+
+    def invalidate(self, idx):
+        self.lines.pop(idx, None)
+        if self.area.highlighter is not None:
+            self.area.highlighter.forget(idx)
+
+    def clear(self):
+        self.lines.clear()
+        if self.area.highlighter is not None:
+            self.area.highlighter.clear()
+
+
+@lru_cache(maxsize=16)
+def compile_highlight(string):
+    """ Case insensitive pattern of string (in a group to split lines) """
+    return re.compile('('+re.escape(string)+')', re.IGNORECASE)
+
+
+class Highlighter:
+    """ Highlighted string of an area
+
+    Splits of drawn lines are cached, and rows of matching items are kept
+    sorted (until selection changes) to jump to next ones by bisection """
+    def __init__(self, area, string):
+        self.area = area
+        self.string = string
+        self.pattern = compile_highlight(string)
+        self.split = lru_cache(maxsize=1024)(self.pattern.split)
+        self.clear()
+
+    def clear(self):
+        self.matches = {}  # item index -> item string matches
+        self.rows = None
+        self.rows_version = None
+
+    def forget(self, idx):
+        self.matches.pop(idx, None)
+        self.rows = None
+
+    def get_rows(self):
+        selection = self.area.selection
+        version = (id(selection), selection.version, selection.reverse)
+        if self.rows is not None and self.rows_version == version:
+            return self.rows
+
+        matches = self.matches
+        search = self.pattern.search
+        while True:
+            try:
+                for item in self.area.itemlist:
+                    idx = item['index']
+                    if idx not in matches and idx in selection:
+                        self.area.item_to_string(item)
+                        matches[idx] = search(item['string']) is not None
+                break
+            # In case items are modified during looping
+            except RuntimeError:
+                pass
+
+        self.rows = [row for row, idx in enumerate(selection)
+                     if matches.get(idx)]
+        self.rows_version = version
+        return self.rows
+
+    def next_row(self, row, reverse=False):
+        """ First matching row after row (before if reverse) """
+        rows = self.get_rows()
+        if not reverse:
+            pos = bisect_right(rows, row)
+            return rows[pos] if pos < len(rows) else None
+        pos = bisect_left(rows, row)
+        return rows[pos-1] if pos else None
+
+
 class ItemArea:
+    # Seconds without move before showing thumbnail
+    thumbnail_delay = 0.2
+
     def __init__(self, screen, name):
         self.screen = screen
         self.mutex = ui_lock
         self.name = name
         self.highlight_on = False
         self.highlight_string = None
+        self.highlighter = None
         self.old_cursor = 0
         self.cursor = 0
         self.last_selected_idx = 0
@@ -1394,11 +1574,12 @@ class ItemArea:
         self.last_selected_item = None
         self.contents = None
         self.shown = False
-        self.selection = deque()
+        self.selection = IndexedList()
         self.user_selection = deque()
         self.last_user_selection = deque()
         self.reverse = False
         self.thumbnail = ''
+        self.thumbnail_timer = None
         self.cursorbg = False
 
         self.itemlist = item_lists.get_list(self.key_class, self.update)
@@ -1445,6 +1626,12 @@ class ItemArea:
         self.width = width-1
         self.win = curses.newwin(self.height+1, self.width, 1, 0)
         self.win.bkgd(Colors.get_color('item', 'normal'))
+        # What is drawn on each line of the window
+        self.drawn = {}
+
+        # Lines depend on width
+        if self.contents is not None:
+            self.contents.clear()
 
     def add_filter(self, name, fun, value=None):
         if not hasattr(self, 'filters'):
@@ -1528,29 +1715,51 @@ class ItemArea:
     def reset_contents(self):
         self.mutex.acquire()
         self.contents = None
-        self.selection = deque()
+        self.selection = IndexedList()
         self.clear_user_selection()
         self.mutex.release()
         if self.shown:
             self.redraw()
 
+    def get_ordering(self):
+        col, _ = self.sort_methods[self.sortname]
+        return item_lists.get_ordering(self.itemlist, self.sortname, col)
+
+    def selection_reverse(self):
+        return self.sort_methods[self.sortname][1] != self.reverse
+
     def add_contents(self, items=None):
         self.mutex.acquire()
 
+        ordering = self.get_ordering()
         if self.contents is None:
-            self.contents = deque()
+            self.contents = LineCache(self)
+            items = None
 
         if items is None:
-            items = self.itemlist
-            self.contents = deque()
+            self.contents.clear()
+            bitset, indexed = self.index_filter()
+            if bitset is None:
+                shown = {item['index']
+                         for item in self.filter(self.itemlist)[0]}
+            else:
+                shown = set(bitset_to_indices(bitset))
+                # Remaining filters only test the indexed candidates
+                if any(self.filters[k] for k in self.filters
+                       if k not in indexed):
+                    items = [item for item in self.itemlist
+                             if item['index'] in shown]
+                    shown = {item['index'] for item in
+                             self.filter(items, skip=indexed)[0]}
+            self.selection = IndexedList(
+                [i for i in ordering.indices() if i in shown],
+                reverse=self.selection_reverse())
 
-        items = self.filter(items)[0]
-        if self.reverse:
-            self.selection.extend([item['index'] for item in items])
-            self.contents.extend(self.items_to_string(items))
         else:
-            self.selection.extendleft([item['index'] for item in items])
-            self.contents.extendleft(self.items_to_string(items))
+            for item in self.filter(items)[0]:
+                if item['index'] not in self.selection:
+                    self.selection.insert_sorted(item['index'],
+                                                 ordering.get_key)
 
         self.mutex.release()
 
@@ -1570,27 +1779,19 @@ class ItemArea:
 
         self.mutex.acquire()
 
+        ordering = self.get_ordering()
         for item in shown_items:
-            try:
-                idx = self.selection.index(item['index'])
-            except ValueError:  # if item not in selection
-                # We need to show it: update contents and selection
-                position = bisect(self.selection, item['index'])
-                self.contents.insert(position, self.item_to_string(item))
-                self.selection.insert(position, item['index'])
-            else:  # if item in selection
-                # Update shown information
-                self.contents[idx] = self.item_to_string(item)
+            idx = item['index']
+            self.contents.invalidate(idx)
+            # Sort key can have changed
+            if idx in self.selection:
+                self.selection.remove(idx)
+            self.selection.insert_sorted(idx, ordering.get_key)
 
         for item in hidden_items:
-            try:
-                idx = self.selection.index(item['index'])
-            except ValueError:  # if item not in selection
-                pass  # Noting to do
-            else:  # if item in selection
-                # Hide it: update contents and selection
-                del self.contents[idx]
-                del self.selection[idx]
+            self.contents.invalidate(item['index'])
+            if item['index'] in self.selection:
+                self.selection.remove(item['index'])
 
         self.mutex.release()
 
@@ -1601,34 +1802,13 @@ class ItemArea:
         item_lists.close_list(self.itemlist, self.update)
 
     def sort_selection(self):
-        col, reverse = self.sort_methods[self.sortname]
-        reverse = reverse != self.reverse
-        idtt = range(len(self.selection))
-        if col is None:
-            permutation = sorted(idtt,
-                                 key=lambda i: self.contents[i].casefold(),
-                                 reverse=reverse)
-        elif isinstance(col, str):
-            if isinstance(self.itemlist[self.selection[0]][col], str):
-                permutation = sorted(
-                    idtt,
-                    key=lambda i: (
-                        self.itemlist[self.selection[i]][col].casefold()),
-                    reverse=reverse
-                )
-            else:
-                permutation = sorted(
-                    idtt, key=lambda i: self.itemlist[self.selection[i]][col],
-                    reverse=reverse
-                )
-        else:
-            permutation = sorted(
-                idtt, key=lambda i: col(self.itemlist[self.selection[i]]),
-                reverse=reverse
-            )
+        # Orderings are kept sorted by item_lists, we only keep shown items
+        self.mutex.acquire()
+        self.selection = IndexedList(
+            [i for i in self.get_ordering().indices() if i in self.selection],
+            reverse=self.selection_reverse())
+        self.mutex.release()
 
-        self.selection = deque([self.selection[p] for p in permutation])
-        self.contents = deque([self.contents[p] for p in permutation])
         print_infos(f'Sort by {self.sortname}', mode='direct')
         self.redraw()
         info_area.show_title(self.get_title_name())
@@ -1642,15 +1822,16 @@ class ItemArea:
 
     def sort_reverse(self):
         self.reverse = not self.reverse
-        self.sort_selection()
+        self.selection.reverse = self.selection_reverse()
+
+        print_infos(f'Sort by {self.sortname}', mode='direct')
+        self.redraw()
+        info_area.show_title(self.get_title_name())
 
     def show_cursor_bg(self):
         self.cursorbg = not self.cursorbg
         self.display()
 
-    def items_to_string(self, items):
-        return list(map(lambda x: self.item_to_string(x), items))
-
     def screen_infos(self):
         line = self.first_line+self.cursor+1
         total = len(self.selection)
@@ -1683,22 +1864,19 @@ class ItemArea:
             self.redraw()
             self.next_highlight()
 
+    def get_highlighter(self):
+        if (self.highlighter is None
+                or self.highlighter.string != self.highlight_string):
+            self.highlighter = Highlighter(self, self.highlight_string)
+        return self.highlighter
+
     def next_highlight(self, reverse=False):
         if self.highlight_string is None:
             return
 
-        item_idx = None
-        no_case_string = self.highlight_string.casefold()
-        if not reverse:
-            for i in range(self.first_line+self.cursor+1, len(self.contents)):
-                if no_case_string in self.contents[i].casefold():
-                    item_idx = i
-                    break
-        else:
-            for i in range(self.first_line+self.cursor-1, -1, -1):
-                if no_case_string in self.contents[i].casefold():
-                    item_idx = i
-                    break
+        with self.mutex:
+            item_idx = self.get_highlighter().next_row(
+                self.first_line+self.cursor, reverse)
 
         if item_idx is not None:
             self.move_cursor(item_idx)
@@ -1725,12 +1903,21 @@ class ItemArea:
                 style = 'greyedout'
             string = string[3:]
 
+        selected = (bool(string) and
+                    self.selection[line+self.first_line] in
+                    self.user_selection)
+        drawn = (string, style, cursor and self.cursorbg, selected,
+                 self.highlight_on and self.highlight_string)
+        # Line has not changed since last frame
+        if self.drawn.get(line) == drawn:
+            return
+        self.drawn[line] = drawn
+
         try:
             self.win.move(line, 0)
             self.win.clrtoeol()
 
             if not string:
-                self.win.refresh()
                 return
 
             style_value = Colors.get_style('item', 'normal')
@@ -1740,7 +1927,7 @@ class ItemArea:
                 Colors.add_style(style_value, 'item', 'blackbg')
 
             # If line is in user selection
-            if self.selection[line+self.first_line] in self.user_selection:
+            if selected:
                 Colors.add_style(style_value, 'item', 'selected')
 
             if self.highlight_on:
@@ -1749,8 +1936,7 @@ class ItemArea:
                 styles = (style_value, highlight_style_value)
 
                 # Split with highlight string and put it back
-                parts = re.split('('+self.highlight_string+')',
-                                 string, flags=re.IGNORECASE)
+                parts = self.get_highlighter().split(string)
 
                 written = 0
                 style_idx = 0
@@ -1762,8 +1948,6 @@ class ItemArea:
             else:
                 color = Colors.get_color_from_style(style_value)
                 self.win.addstr(line, 0, string, color)
-
-            self.win.refresh()
         except curses.error:
             pass
 
@@ -1939,6 +2123,30 @@ class ItemArea:
             elif self.thumbnail == 'full':
                 termimage.draw(image)
 
+    def show_thumbnail_later(self):
+        """ Show thumbnail once cursor has not moved for a short time """
+        if self.thumbnail_timer is not None:
+            self.thumbnail_timer.cancel()
+
+        if not self.thumbnail:
+            self.show_thumbnail()
+            return
+
+        def show_thumbnail_task(item):
+            # Get file (can be long) before locking screen
+            if item is not None:
+                self.item_get_thumbnail(item)
+            with self.mutex:
+                if (tabs.get_current_area() is self
+                        and self.get_current_item() is item):
+                    self.show_thumbnail()
+
+        self.thumbnail_timer = Timer(self.thumbnail_delay,
+                                     show_thumbnail_task,
+                                     (self.get_current_item(), ))
+        self.thumbnail_timer.daemon = True
+        self.thumbnail_timer.start()
+
     def switch_thumbnail_mode(self):
         if not termimage.compatible(print_infos):
             return
@@ -2007,7 +2215,7 @@ class ItemArea:
         if self.selection:  # if display is not empty
             self.last_selected_item = self.itemlist[self.selection[idx]]
         self.display(redraw)
-        self.show_thumbnail()
+        self.show_thumbnail_later()
 
     def reset_display(self):
         self.old_cursor = 0
@@ -2060,6 +2268,9 @@ class ItemArea:
 
         # We draw all the page (shift)
         if redraw:
+            # Window can have been hidden by other ones, curses only sends
+            # lines that differ from the screen
+            self.win.touchwin()
             for line_number in range(self.height):
                 if self.first_line+line_number < len(self.contents):
                     line = self.contents[self.first_line+line_number]
@@ -2084,6 +2295,12 @@ class ItemArea:
                             self.contents[self.first_line+self.cursor],
                             style='bold')
 
+        try:
+            self.win.noutrefresh()
+            frame.update()
+        except curses.error:
+            pass
+
         if mutex:
             self.mutex.release()
 
@@ -2112,8 +2329,9 @@ class ItemArea:
 
     def item_match_search(self, item):
         if self.filters['search'] and self.highlight_string:
+            # Not yet formatted
             if 'string' not in item:
-                return False
+                self.item_to_string(item)
 
             no_case_string = self.highlight_string.casefold()
             if no_case_string not in item['string'].casefold():
@@ -2128,15 +2346,22 @@ class ItemArea:
 
         return True
 
-    def filter(self, items):
+    def index_filter(self):
+        """ Bitset of items matching indexed filters (None if the area has no
+        index) and names of these filters """
+        return None, ()
+
+    def filter(self, items, skip=()):
         matching_items = []
         other_items = []
+        match_funs = [fun for name, fun in self.filters_fun.items()
+                      if name not in skip]
 
         while True:
             try:
                 for item in items:
                     match = True
-                    for match_fun in self.filters_fun.values():
+                    for match_fun in match_funs:
                         if not match_fun(item):
                             match = False
                             break
@@ -2199,6 +2424,7 @@ class MediumArea(ItemArea):
 
     def apply_config(self):
         self.reverse = Config.get('Global.media_reverse')
+        self.selection.reverse = self.selection_reverse()
 
     def extract_channel_name(self, line):
         parts = line.split(u" \u2022 ")
@@ -2293,6 +2519,26 @@ class MediumArea(ItemArea):
         print_infos(f'Show media in {self.filters["location"]}')
         self.reset_contents()
 
+    def index_filter(self):
+        filters = self.filters
+        cids = None
+        if not (filters['channels'] is None
+                and filters['categories'] is None):
+            cids = [c['id'] for c in item_lists.channels
+                    if ((filters['channels'] is None
+                         or c['title'] in filters['channels'])
+                        and (filters['categories'] is None
+                             or not (set(filters['categories'])
+                                     - set(c['categories']))))]
+
+        bitset = item_lists.get_media_index().select(
+            state=None if filters['state'] == 'all' else filters['state'],
+            location=(None if filters['location'] == 'all'
+                      else filters['location']),
+            cids=cids, tags=filters['tags'])
+        return bitset, ('state', 'location', 'channels', 'categories',
+                        'tags')
+
     def medium_match_location(self, item):
         return (self.filters['location'] == 'all'
                 or self.filters['location'] == item['location'])
@@ -2324,14 +2570,11 @@ class MediumArea(ItemArea):
         formatted_item['duration'] = duration_to_str(medium['duration'])
         formatted_item['channel'] = formatted_item['channel']['title']
         formatted_item['tags'] = list_to_commastr(medium['tags'])
-        try:
-            formatted_item['size'] = (
-                str(int(os.path.getsize(
-                    formatted_item['filename'])/1024**2))+'MB'
-                if formatted_item['filename']
-                else '')
-        except FileNotFoundError:
-            formatted_item['size'] = ''
+        # Size is stored at download (checked by reconciler)
+        formatted_item['size'] = (
+            str(int(medium.get('size', 0)/1024**2))+'MB'
+            if formatted_item['filename']
+            else '')
 
         separator = u" \u2022 "
 
@@ -2390,7 +2633,8 @@ class ChannelArea(ItemArea):
         self.add_filter('categories', self.channel_match_categories)
 
         self.sort_methods = {
-            'last video': (lambda c: c['media'][-1]['date'], True),
+            'last video': (
+                lambda c: c['media'][-1]['date'] if c['media'] else 0, True),
             'title': ('title', False),
         }
         self.sortname = 'last video'
@@ -2400,6 +2644,7 @@ class ChannelArea(ItemArea):
 
     def apply_config(self):
         self.reverse = Config.get('Global.channel_reverse')
+        self.selection.reverse = self.selection_reverse()
 
     def filter_by_categories(self, categories=None):
         if categories is None and self.filters['categories']:
@@ -2510,6 +2755,7 @@ class BrowseArea(ItemArea):
 
     def apply_config(self):
         self.reverse = Config.get('Global.media_reverse')
+        self.selection.reverse = self.selection_reverse()
 
     def extract_channel_name(self, line):
         parts = line.split(u" \u2022 ")
@@ -2643,16 +2889,30 @@ class PlaylistArea(BrowseArea):
 
 
 class InfoArea:
+    # Maximal number of normal messages shown per second
+    max_rate = 10
+    # Number of times download progress is sampled per second
+    progress_rate = 2
+
     def __init__(self, screen):
         self.screen = screen
         self.title = None
+        # Download progress, shown at the right of title
+        self.progress = ''
 
         self.mutex = ui_lock
-        self.messages = Queue()
         self.max_messages = 5000
-        self.errors = deque(maxlen=self.max_messages)
-        self.all_messages = deque(maxlen=self.max_messages)
-        self.need_to_wait = False
+        self.errors = MessageHistory(self.max_messages)
+        self.all_messages = MessageHistory(self.max_messages)
+
+        # Messages to show: all errors, last direct message and last
+        # message of each thread
+        self.status_cond = Condition()
+        self.pending_errors = deque()
+        self.pending_direct = None
+        self.pending = OrderedDict()
+        # Messages under level wait until time
+        self.block = (0, 0)
         message_handler = Thread(target=self.handle_queue)
         message_handler.daemon = True
         message_handler.start()
@@ -2683,60 +2943,90 @@ class InfoArea:
             return
 
         try:
-            title = format_string(self.title, self.width-1)
+            title = format_string(self.title,
+                                  self.width-1-len(self.progress))
+            title += self.progress
             self.title_win.move(0, 0)
             self.title_win.clrtoeol()
             self.title_win.addstr(0, 0, title)
-            self.title_win.refresh()
+            self.title_win.noutrefresh()
+            frame.update()
         except curses.error:
             pass
 
+    def show_progress(self, downloads):
+        """ Show progress of downloads (as given by download manager) """
+        if not downloads:
+            progress = ''
+        else:
+            done = sum(d[1] for d in downloads)
+            totals = [d[2] for d in downloads]
+            rate = sum(d[3] for d in downloads)
+            if all(totals):
+                amount = f'{done*100//max(sum(totals), 1)}%'
+            else:
+                amount = format_size(done)
+            progress = (f' {len(downloads)} dl: {amount} '
+                        f'{format_size(rate)}/s')
+
+        if progress != self.progress:
+            self.progress = progress
+            with self.mutex:
+                self.show_title()
+
     def handle_queue(self):
-        """This is the worker thread function. It processes items in the queue one
-        after another.  These daemon threads go into an infinite loop, and only
-        exit when the main thread ends."""
+        """ Status thread: errors are shown for one second, direct messages
+        are shown before normal ones for one second, and normal messages
+        (only last one of each thread) at most max_rate per second """
+        cond = self.status_cond
         while True:
-            message = self.messages.get()
+            with cond:
+                if self.pending_errors:
+                    level = 2
+                elif self.pending_direct is not None:
+                    level = 1
+                elif self.pending:
+                    level = 0
+                else:
+                    cond.wait()
+                    continue
+
+                block_level, until = self.block
+                wait = until-time.time()
+                if level < block_level and wait > 0:
+                    cond.wait(wait)
+                    continue
+
+                now = time.time()
+                if level == 2:
+                    message = self.pending_errors.popleft()
+                    self.block = (3, now+1)
+                elif level == 1:
+                    message = self.pending_direct
+                    self.pending_direct = None
+                    self.block = (1, now+1)
+                else:
+                    _, message = self.pending.popitem(last=False)
+                    self.block = (1, now+1/self.max_rate)
+
             self.print_raw_task(message)
-            self.messages.task_done()
 
-    def print_raw_task(self, string, mutex=True, need_to_wait=False):
+    def print_raw_task(self, string, mutex=True):
         try:
             if mutex:
                 self.mutex.acquire()
 
-            # If error happened wait before showing new message
-            if self.need_to_wait:
-                wait_time = 1-(time.time()-self.need_to_wait)
-                self.need_to_wait = 0
-                if wait_time > 0:
-                    sleep(wait_time)
-
-            if need_to_wait:
-                self.need_to_wait = time.time()
-
             self.status_win.move(0, 0)
             self.status_win.clrtoeol()
             self.status_win.addstr(0, 0, str(string))
-            self.status_win.refresh()
+            self.status_win.noutrefresh()
+            frame.update()
         except curses.error:
             pass
         finally:
             if mutex:
                 self.mutex.release()
 
-    def print_raw(self, string, mutex=True, need_to_wait=False):
-        args = (string, )
-        kwargs = {'mutex': mutex, 'need_to_wait': need_to_wait}
-        if need_to_wait:
-            print_handler = Thread(target=self.print_raw_task,
-                                   args=args, kwargs=kwargs)
-            print_handler.daemon = True
-            print_handler.start()
-
-        else:
-            self.print_raw_task(*args, **kwargs)
-
     def print(self, value, mode=None, mutex=True):
         if mode not in (None, 'direct', 'error', 'prompt', 'clear'):
             raise ValueError('Wrong print mode')
@@ -2753,15 +3043,19 @@ class InfoArea:
         else:
             short_string = string
 
-        if mode in ('direct', 'error', 'prompt', 'clear'):
-            if mode in ('prompt', 'clear'):
-                need_to_wait = False
-            else:
-                need_to_wait = True
-            self.print_raw(short_string, mutex=mutex,
-                           need_to_wait=need_to_wait)
+        if mode in ('prompt', 'clear'):
+            self.print_raw_task(short_string, mutex=mutex)
         else:
-            self.messages.put(short_string)
+            with self.status_cond:
+                if mode == 'error':
+                    self.pending_errors.append(short_string)
+                elif mode == 'direct':
+                    self.pending_direct = short_string
+                else:
+                    source = get_ident()
+                    self.pending.pop(source, None)
+                    self.pending[source] = short_string
+                self.status_cond.notify()
 
         if mode == 'error':
             now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -2776,7 +3070,8 @@ class InfoArea:
     def print_messages(self, messages, file=None):
         if file is not None:
             with open(file, 'w') as f:
-                print('\n'.join(messages), f)
+                for message in messages:
+                    print(message, file=f)
         else:
             print_terminal(messages, mutex=self.mutex)
 
@@ -2967,7 +3262,45 @@ class Textbox:
         return key
 
 
+class Frame:
+    """ Windows are only marked for update with noutrefresh, the terminal
+    is updated at most Global.max_fps times per second """
+    def __init__(self):
+        self.last_update = 0
+        self.timer = None
+        self.mutex = Lock()
+
+    def update(self):
+        """ Update terminal now or schedule it (caller holds ui_lock) """
+        min_interval = 1/max(1, Config.get('Global.max_fps'))
+        with self.mutex:
+            # Next frame already scheduled
+            if self.timer is not None:
+                return
+
+            wait = self.last_update+min_interval-time.time()
+            if wait > 0:
+                self.timer = Timer(wait, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+                return
+            self.last_update = time.time()
+
+        curses.doupdate()
+
+    def flush(self):
+        with ui_lock:
+            with self.mutex:
+                self.timer = None
+                self.last_update = time.time()
+            try:
+                curses.doupdate()
+            except curses.error:
+                pass
+
+
 ui_lock = Lock()
+frame = Frame()
 screen = None
 screen_size = None
 tabs = None
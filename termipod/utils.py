@@ -21,47 +21,102 @@ import sys
 import re
 import shlex
 import unicodedata
+import tempfile
+import os
 from os import system, name
+from collections import deque
+from threading import Lock
+from functools import lru_cache
 
 import termipod.config as Config
 
 
-def printable_str(string):
-    new_str = ''
+# ANSI escape sequences
+ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+printable_ascii = re.compile('[ -~]*')
 
-    for c in string:
-        # Remove ANSI escape sequences
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        c = ansi_escape.sub('', c)
 
-        # For zero-width characters
+class PrintableTable(dict):
+    """ Table for str.translate filled on first use of each character:
+    zero-width characters are removed and wide ones replaced """
+    def __missing__(self, code):
+        c = chr(code)
         if unicodedata.category(c)[0] in ('M', 'C'):
-            continue
-
-        w = unicodedata.east_asian_width(c)
-        if w in ('N', 'Na', 'H', 'A'):
-            new_str += c
+            value = None
+        elif unicodedata.east_asian_width(c) in ('N', 'Na', 'H', 'A'):
+            value = code
         else:
-            new_str += '🖥'
+            value = '🖥'
+        self[code] = value
+        return value
+
 
-    return new_str
+printable_table = PrintableTable()
+
+
+def printable_str(string):
+    if '\x1b' in string:
+        string = ansi_escape.sub('', string)
+
+    if printable_ascii.fullmatch(string):
+        return string
+
+    return string.translate(printable_table)
 
 
 def print_log(string):
     string = str(string)
     if Config.get('Global.log_path'):
-        if print_log.reset:
-            mode = 'w'
-            print_log.reset = False
-        else:
-            mode = 'a'
-        with open(Config.get('Global.log_path'), mode) as myfile:
-            myfile.write(string+"\n")
+        # Line buffered: nothing is lost nor written twice by forked
+        # download processes
+        if print_log.file is None:
+            print_log.file = open(Config.get('Global.log_path'), 'w',
+                                  buffering=1)
+        print_log.file.write(string+"\n")
     else:
         print(string)
 
 
-print_log.reset = True
+print_log.file = None
+
+
+class MessageHistory:
+    """ Last messages are kept in memory, older ones are spilled to an
+    anonymous temporary file (append only, buffered) """
+    def __init__(self, maxlen=5000):
+        self.recent = deque(maxlen=maxlen)
+        self.spill = None
+        self.mutex = Lock()
+
+    def append(self, message):
+        with self.mutex:
+            if len(self.recent) == self.recent.maxlen:
+                if self.spill is None:
+                    self.spill = tempfile.TemporaryFile()
+                self.spill.write(self.recent.popleft().encode()+b'\n')
+            self.recent.append(message)
+
+    def __iter__(self):
+        """ All messages, spilled ones are read by chunks """
+        with self.mutex:
+            recent = list(self.recent)
+            size = 0
+            if self.spill is not None:
+                self.spill.flush()
+                size = self.spill.tell()
+                fd = self.spill.fileno()
+
+        offset = 0
+        rest = b''
+        while offset < size:
+            chunk = os.pread(fd, min(1 << 16, size-offset), offset)
+            offset += len(chunk)
+            lines = (rest+chunk).split(b'\n')
+            rest = lines.pop()
+            for line in lines:
+                yield line.decode()
+
+        yield from recent
 
 
 def ts_to_date(ts):
@@ -94,28 +149,33 @@ def format_string(string, width, truncate=True):
             return string+' '*space
 
     else:
-        strings = []
-        string_list = string.split(' ')
-        while string_list:
-            line = ''
-            remain = width
-            # We fill in the line
-            while string_list and len(string_list[0]) <= remain:
-                s = string_list.pop(0)
-                line += s+' '
-                remain -= len(s)+1
-
-            # Check we got someting to put
-            if not line:  # line was too long to be nicely cut
-                line = string_list[0][:width]
-                string_list[0] = string_list[0][width:]
-                strings.append(line)
-            else:
-                line = line[:-1]  # remove last ' '
-                remain += 1
-                strings.append(line+' '*remain)
-
-        return strings
+        return list(wrap_string(string, width))
+
+
+@lru_cache(maxsize=4096)
+def wrap_string(string, width):
+    """ Lines of string cut at spaces and padded to width (tuple, cached) """
+    strings = []
+    words = string.split(' ')
+    idx = 0
+    while idx < len(words):
+        line_words = []
+        remain = width
+        # We fill in the line
+        while idx < len(words) and len(words[idx]) <= remain:
+            line_words.append(words[idx])
+            remain -= len(words[idx])+1
+            idx += 1
+
+        # Check we got someting to put
+        if not line_words:  # line was too long to be nicely cut
+            strings.append(words[idx][:width])
+            words[idx] = words[idx][width:]
+        else:
+            line = ' '.join(line_words)
+            strings.append(line+' '*(width-len(line)))
+
+    return tuple(strings)
 
 
 def options_string_to_dict(string, keys):
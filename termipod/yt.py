@@ -24,8 +24,11 @@ import feedparser as fp
 import youtube_dl as ytdl
 
 from termipod.utils import printable_str
-from termipod.backends_exceptions import DownloadError
+from termipod.rules import compile_pattern
+from termipod.backends_exceptions import (DownloadError, HostError,
+                                          is_host_failure)
 import termipod.config as Config
+import termipod.bandwidth as bandwidth
 # printable_str = print
 
 
@@ -33,19 +36,10 @@ class DownloadLogger(object):
     def __init__(self, print_infos, url):
         self.print_infos = print_infos
         self.url = url
-        self.step = 0
 
     def debug(self, msg):
-        regex = ('.*\[download\] *([0-9.]*)% of *[0-9.]*.i_b '
-                 'at *[0-9.]*.i_b/s ETA ([0-9:]*)')
-        match = re.match(regex, msg)
-        if match is not None:
-            percentage = int(float(match.groups()[0]))
-            eta = match.groups()[1]
-            if percentage >= self.step:
-                self.print_infos('Downloading %s (%d%% ETA %s)...' %
-                                 (self.url, percentage, eta))
-                self.step = int(percentage/10+1)*10
+        # Progress is given by progress hook
+        pass
 
     def warning(self, msg):
         self.print_infos('[YTDL warning] %s' % msg)
@@ -134,15 +128,33 @@ def get_mpv_config():
     return config
 
 
-def download(url, filename, print_infos):
+def download(url, filename, print_infos, progress):
+    # Bytes already counted in bandwidth, by file (video and audio can be
+    # downloaded separately)
+    counted = {}
+
+    def progress_hook(status):
+        if status['status'] in ('downloading', 'finished'):
+            total = (status.get('total_bytes')
+                     or status.get('total_bytes_estimate'))
+            done = status.get('downloaded_bytes', 0)
+            # Slowing down the hook slows down the download
+            name = status.get('filename')
+            bandwidth.consume(max(0, done-counted.get(name, 0)))
+            counted[name] = done
+            progress(done, total)
+
     ydl_opts = {'logger': DownloadLogger(print_infos, url),
+                'progress_hooks': [progress_hook],
                 'outtmpl': filename, 'format': 'mp4'}
     ydl_opts.update(get_user_config())
     with ytdl.YoutubeDL(ydl_opts) as ydl:
         try:
             ydl.download([url])
-        except ytdl.DownloadError:
-            raise DownloadError
+        except ytdl.DownloadError as e:
+            if is_host_failure(e):
+                raise HostError(str(e))
+            raise DownloadError(str(e))
 
 
 def get_filename_extension(medium):
@@ -176,9 +188,9 @@ def get_data(source, opts, print_infos, force_all=False):
     allow_video = 'type' in opts and opts['type'] in ('video', 'all')
     allow_channel = 'type' not in opts or opts['type'] in ('channel', 'all')
 
-    mask = False
+    mask_match = None
     if 'mask' in opts and opts['mask']:
-        mask = opts['mask']
+        mask_match = compile_pattern(opts['mask']).match
 
     if new:
         url = source
@@ -264,9 +276,8 @@ def get_data(source, opts, print_infos, force_all=False):
                     i += 1
                     continue
 
-                if mask:
-                    regex = re.compile(mask)
-                    if not regex.match(entry['title']):
+                if mask_match is not None:
+                    if not mask_match(entry['title']):
                         i += 1
                         continue
 
@@ -347,7 +358,11 @@ def get_data(source, opts, print_infos, force_all=False):
 
     else:
         feed_url = get_feed_url(url)
-        rss = fp.parse(feed_url)
+        try:
+            rss = fp.parse(bandwidth.read_url(feed_url, 'feed'))
+        except OSError:
+            print_infos(f'Cannot load {feed_url}')
+            return None
         feed = rss.feed
         if not feed:
             print_infos(f'Cannot load {feed_url}')
@@ -378,9 +393,8 @@ def get_data(source, opts, print_infos, force_all=False):
                 overlap = True
                 break
 
-            if mask:
-                regex = re.compile(mask)
-                if not regex.match(medium['title']):
+            if mask_match is not None:
+                if not mask_match(medium['title']):
                     continue
 
             # Get missing info
@@ -497,7 +511,10 @@ def expand_link(link):
 
 
 def shrink_link(link):
-    return re.sub(r'^https://www.youtube.com/watch\?v=', '', link)
+    prefix = 'https://www.youtube.com/watch?v='
+    if link.startswith(prefix):
+        return link[len(prefix):]
+    return link
 
 
 def search_media(search, print_infos, get_info=False, count=30):
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# termipod
+# Copyright (c) 2020 Cyril Bordage
+#
+# termipod is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# termipod is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+""" Resume of interrupted downloads against a local HTTP server """
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import termipod.config as Config
+import termipod.httpdownload as httpdownload
+from termipod.backends_exceptions import DownloadError
+
+
+class Handler(BaseHTTPRequestHandler):
+    """ Serves server.data with server.etag, honoring Range and If-Range.
+    If server.drop is set, connection is closed after a third of the body,
+    if server.error is set, it is sent instead """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.error:
+            self.send_response(server.error)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        data = server.data
+        start = 0
+        byte_range = self.headers.get('Range')
+        if byte_range and self.headers.get('If-Range') == server.etag:
+            start = int(byte_range.split('=')[1].split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             f'bytes {start}-{len(data)-1}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data)-start))
+        self.send_header('ETag', server.etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        body = data[start:]
+        if server.drop:
+            body = body[:len(body)//3]
+            self.close_connection = True
+        self.wfile.write(body)
+        server.sent += len(body)
+
+
+class TestResume(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        Config.init(config_path=os.path.join(cls.tmpdir, 'termipod.yaml'))
+        Config.set('Global.download_segments', 1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.server.data = os.urandom(1024**2+123)
+        self.server.etag = '"v1"'
+        self.server.drop = True
+        self.server.error = None
+        self.server.requests = []
+        self.server.sent = 0
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.url = f'http://127.0.0.1:{self.server.server_port}/medium.mp3'
+        self.filename = os.path.join(self.tmpdir, 'medium.mp3')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for filename in (self.filename, self.filename+'.part',
+                         self.filename+'.part.json'):
+            if os.path.exists(filename):
+                os.unlink(filename)
+
+    def interrupted_download(self):
+        """ First download, dropped mid-transfer, returns partial size """
+        with self.assertRaises(DownloadError):
+            httpdownload.download(self.url, self.filename)
+        part = self.filename+'.part'
+        self.assertTrue(os.path.exists(part+'.json'))
+        size = os.path.getsize(part)
+        self.assertEqual(size, len(self.server.data)//3)
+        return size
+
+    def check_downloaded(self):
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.server.data)
+        self.assertFalse(os.path.exists(self.filename+'.part'))
+        self.assertFalse(os.path.exists(self.filename+'.part.json'))
+
+    def test_resume(self):
+        offset = self.interrupted_download()
+        self.server.drop = False
+        validator = httpdownload.download(self.url, self.filename)
+
+        self.assertEqual(validator, '"v1"')
+        request = self.server.requests[-1]
+        self.assertEqual(request['Range'], f'bytes={offset}-')
+        self.assertEqual(request['If-Range'], '"v1"')
+        # Only missing bytes are sent again
+        self.assertEqual(self.server.sent, len(self.server.data))
+        self.check_downloaded()
+
+    def test_changed_file(self):
+        self.interrupted_download()
+        self.server.drop = False
+        self.server.data = os.urandom(1024**2+321)
+        self.server.etag = '"v2"'
+        validator = httpdownload.download(self.url, self.filename)
+
+        # If-Range did not match: whole new file is downloaded
+        self.assertEqual(validator, '"v2"')
+        self.assertEqual(self.server.requests[-1]['If-Range'], '"v1"')
+        self.check_downloaded()
+
+    def test_transient_error(self):
+        offset = self.interrupted_download()
+        self.server.error = 503
+        with self.assertRaises(DownloadError):
+            httpdownload.download(self.url, self.filename)
+        self.assertEqual(os.path.getsize(self.filename+'.part'), offset)
+
+        self.server.error = None
+        self.server.drop = False
+        httpdownload.download(self.url, self.filename)
+        self.assertEqual(self.server.requests[-1]['Range'],
+                         f'bytes={offset}-')
+        self.check_downloaded()
+
+    def test_no_resume(self):
+        with self.assertRaises(DownloadError):
+            httpdownload.download(self.url, self.filename, resume=False)
+        self.assertFalse(os.path.exists(self.filename+'.part'))
+        self.assertFalse(os.path.exists(self.filename+'.part.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()